@@ -1,25 +1,147 @@
+import asyncio
+import hmac
+import io
+import os
+import time
+import tempfile
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from typing import Optional
+from starlette.requests import ClientDisconnect
+import pandas as pd
 from uvicorn import run as app_run
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, RedirectResponse
+from fastapi.responses import JSONResponse, Response, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from shipment.utils.main_utils import Mainutils
+from pydantic import ValidationError
 
 from shipment.component.model_predictor import CostPredictor, shippingData
-from shipment.constant import APP_HOST, APP_PORT
-from shipment.pipeline.training_pipeline import TrainPipeline
+from shipment.component.inference_executor import InferenceExecutor
+from shipment.component.prediction_batcher import PredictionBatcher
+from shipment.component.prediction_cache import PredictionCache
+from shipment.component.stream_scorer import StreamScorer
+from shipment.constant import (
+    APP_HOST,
+    APP_PORT,
+    ADMISSION_ENABLED,
+    APP_WORKERS,
+    ARROW_SPOOL_MAX_MEMORY_MB,
+    PREDICTION_BATCHING_ENABLED,
+    PROFILING_MAX_SECONDS,
+    PROFILING_TOKEN,
+    WARMUP_ROWS,
+)
+from shipment.entity.prediction_entity import (
+    PredictionResponse,
+    QuoteMatrixRequest,
+    QuoteMatrixResponse,
+    ShipmentRequest,
+)
+from shipment.exception import InferenceRejectedException, ProfilerBusyException
+from shipment.logger import logging
+from shipment.pipeline.training_job import TrainingJobManager
+from shipment.utils.admission_control import AdmissionController, AdmissionControlMiddleware
+from shipment.utils.metrics import (
+    ERRORS_TOTAL,
+    MODEL_INFO,
+    REGISTRY,
+    Counter,
+    Gauge,
+    MetricsMiddleware,
+    stage_timer,
+)
+from shipment.utils.profiler import ServiceProfiler
+from shipment.utils.serialization import DuplexStreamingResponse, FastJSONResponse, dumps
+
+
+
 
+async def warm_up() -> None:
+    # Pays model loading, first call allocations and template compilation before traffic arrives
+    try:
+        if WARMUP_ROWS > 0:
+            model_version = await asyncio.to_thread(cost_predictor.warm_up, WARMUP_ROWS)
+            # Starts the executor workers with one call through the request path
+            await inference_executor.predict(
+                X=shippingData.get_sample_records(1), deadline_ms=None
+            )
+            logging.info(f"Warmed up model version {model_version}")
+
+        warmup_request = Request(
+            {
+                "type": "http",
+                "app": app,
+                "router": app.router,
+                "method": "GET",
+                "path": "/predict",
+                "root_path": "",
+                "scheme": "http",
+                "server": (APP_HOST, APP_PORT),
+                "headers": [],
+                "query_string": b"",
+            }
+        )
+        templates.get_template("index.html").render(request=warmup_request, context="Rendering")
+
+        app.state.ready = True
+        logging.info("Warm up finished, instance is ready")
+
+    except Exception as e:
+        logging.error(f"Warm up failed, instance stays not ready: {e}")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The server accepts connections during the warm up, /live answers and /ready reports 503
+    app.state.ready = False
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    warmup_task.cancel()
+    inference_executor.shutdown()
+    training_job_manager.shutdown()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 templates = Jinja2Templates(directory="templates")
 
+# Single predictor for the process, the model is loaded once and hot reloaded on change
+cost_predictor = CostPredictor()
+inference_executor = InferenceExecutor(cost_predictor.model_path)
+prediction_batcher = PredictionBatcher(inference_executor)
+prediction_cache = PredictionCache()
+stream_scorer = StreamScorer(inference_executor)
+training_job_manager = TrainingJobManager()
+admission_controller = AdmissionController()
+service_profiler = ServiceProfiler()
+
+# Counts kept by the cache and the executor are read when /metrics is scraped
+for cache_stat in ("hits", "misses", "deduplicated", "evictions"):
+    Counter(
+        f"shipment_prediction_cache_{cache_stat}_total", f"Prediction cache {cache_stat}."
+    ).set_function(lambda cache_stat=cache_stat: getattr(prediction_cache, cache_stat))
+Gauge("shipment_prediction_cache_size", "Entries in the prediction cache.").set_function(
+    lambda: prediction_cache.stats()["size"]
+)
+Gauge("shipment_inference_pending", "Inference calls queued or running.").set_function(
+    lambda: inference_executor.pending
+)
+Gauge("shipment_admission_active", "Prediction requests holding an admission slot.").set_function(
+    lambda: admission_controller.active
+)
+Gauge("shipment_admission_queued", "Prediction requests waiting for an admission slot.").set_function(
+    lambda: admission_controller.queued
+)
+Gauge("shipment_ready", "1 once the startup warm up has finished.").set_function(
+    lambda: float(getattr(app.state, "ready", False))
+)
+
+
+# Added first so that it runs inside CORS and metrics, shed responses get CORS headers and are counted
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware, admission_controller=admission_controller)
 
 origins = ["*"]
 
@@ -31,66 +153,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 
 
 class DataForm:
     def __init__(self, request: Request):
         self.request: Request = request
-        self.artist: Optional[str] = None
-        self.height: Optional[str] = None
-        self.width: Optional[str] = None
-        self.weight: Optional[str] = None
-        self.material: Optional[str] = None
-        self.priceOfSculpture: Optional[str] = None
-        self.baseShippingPrice: Optional[str] = None
-        self.international: Optional[str] = None
-        self.expressShipment: Optional[str] = None
-        self.installationIncluded: Optional[str] = None
-        self.transport: Optional[str] = None
-        self.fragile: Optional[str] = None
-        self.customerInformation: Optional[str] = None
-        self.remoteLocation: Optional[str] = None
-
-    async def get_shipping_data(self):
+
+    async def get_shipping_data(self) -> shippingData:
         form = await self.request.form()
-        self.artist = form.get("artist")
-        self.height = form.get("height")
-        self.width = form.get("width")
-        self.weight = form.get("weight")
-        self.material = form.get("material")
-        self.priceOfSculpture = form.get("priceOfSculpture")
-        self.baseShippingPrice = form.get("baseShippingPrice")
-        self.international = form.get("international")
-        self.expressShipment = form.get("expressShipment")
-        self.installationIncluded = form.get("installationIncluded")
-        self.transport = form.get("transport")
-        self.fragile = form.get("fragile")
-        self.customerInformation = form.get("customerInformation")
-        self.remoteLocation = form.get("remoteLocation")
+        return shippingData.from_mapping(form)
 
 
 
 @app.get("/train")
 async def trainRouteClient():
     try:
-        train_pipeline = TrainPipeline()
+        training_job = training_job_manager.submit()
 
-        train_pipeline.run_pipeline()
-
-        return Response("Training successful !!")
+        return JSONResponse(
+            {"job_id": training_job.job_id, "status": training_job.status},
+            status_code=202,
+        )
 
     except Exception as e:
         return Response(f"Error Occurred! {e}")
 
 
+@app.get("/train/jobs")
+async def trainJobsRouteClient():
+    return training_job_manager.list_jobs()
+
+
+@app.get("/train/{job_id}")
+async def trainStatusRouteClient(job_id: str):
+    training_job = training_job_manager.get(job_id)
+    if training_job is None:
+        return JSONResponse({"status": False, "error": f"Unknown job {job_id}"}, status_code=404)
+    return training_job
+
+
 
 @app.get("/predict")
 async def predictGetRouteClient(request: Request):
     try:
         
         return templates.TemplateResponse(
+            request,
             "index.html",
-            {"request": request, "context": "Rendering"},
+            {"context": "Rendering"},
         )
 
     except Exception as e:
@@ -98,42 +210,375 @@ async def predictGetRouteClient(request: Request):
 
 
 
+async def predict_cost(shipping_data: shippingData) -> float:
+    # Shared by the form and JSON routes: cached, optionally micro batched, scored off the event loop
+    async def compute_cost() -> float:
+        with stage_timer("build_input"):
+            cost_record = shipping_data.get_input_record()
+        if PREDICTION_BATCHING_ENABLED:
+            return await prediction_batcher.predict(X=cost_record)
+        return await inference_executor.predict(X=cost_record)
+
+    with stage_timer("predict"):
+        return round(
+            await prediction_cache.get_or_compute(
+                prediction_cache.make_key(shipping_data),
+                inference_executor.model_version,
+                compute_cost,
+            ),
+            2,
+        )
+
+
 @app.post("/predict")
 async def predictRouteClient(request: Request):
     try:
 
-        form = DataForm(request)
-        await form.get_shipping_data()
-
-        shipping_data = shippingData(
-            artist=form.artist,
-            height=form.height,
-            width=form.width,
-            weight=form.weight,
-            material=form.material,
-            priceOfSculpture=form.priceOfSculpture,
-            baseShippingPrice=form.baseShippingPrice,
-            international=form.international,
-            expressShipment=form.expressShipment,
-            installationIncluded=form.installationIncluded,
-            transport=form.transport,
-            fragile=form.fragile,
-            customerInformation=form.customerInformation,
-            remoteLocation=form.remoteLocation,
+        with stage_timer("parse_form"):
+            shipping_data = await DataForm(request).get_shipping_data()
+
+        cost_value = await predict_cost(shipping_data)
+
+        with stage_timer("render"):
+            return templates.TemplateResponse(
+                request,
+                "index.html",
+                {"context": cost_value},
+            )
+
+    except InferenceRejectedException as e:
+        ERRORS_TOTAL.labels("/predict", type(e).__name__).inc()
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=503)
+
+    except Exception as e:
+        ERRORS_TOTAL.labels("/predict", type(e).__name__).inc()
+        return {"status": False, "error": f"{e}"}
+
+
+@app.post(
+    "/predict/json",
+    response_model=PredictionResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": ShipmentRequest.model_json_schema()}},
+        }
+    },
+)
+async def predictJsonRouteClient(request: Request):
+    try:
+        # Parsed and validated in one pass by pydantic, without form parsing or template rendering
+        with stage_timer("parse_json"):
+            shipment_request = ShipmentRequest.model_validate_json(await request.body())
+            shipping_data = shippingData(**shipment_request.model_dump())
+
+    except ValidationError as e:
+        ERRORS_TOTAL.labels("/predict/json", type(e).__name__).inc()
+        return FastJSONResponse(
+            {"status": False, "error": e.errors(include_url=False, include_context=False, include_input=False)},
+            status_code=422,
         )
 
-        cost_df = shipping_data.get_input_data_frame()
-        cost_predictor = CostPredictor()
-        cost_value = round(cost_predictor.predict(X=cost_df), 2)
+    except ValueError as e:
+        ERRORS_TOTAL.labels("/predict/json", type(e).__name__).inc()
+        return FastJSONResponse({"status": False, "error": f"{e}"}, status_code=422)
 
-        return templates.TemplateResponse(
-            "index.html",
-            {"request": request, "context": cost_value},
+    try:
+        cost_value = await predict_cost(shipping_data)
+        return FastJSONResponse(
+            {
+                "status": True,
+                "cost": cost_value,
+                "model_version": inference_executor.model_version,
+            }
         )
 
+    except InferenceRejectedException as e:
+        ERRORS_TOTAL.labels("/predict/json", type(e).__name__).inc()
+        return FastJSONResponse({"status": False, "error": f"{e}"}, status_code=503)
 
     except Exception as e:
-        return {"status": False, "error": f"{e}"}
+        ERRORS_TOTAL.labels("/predict/json", type(e).__name__).inc()
+        return FastJSONResponse({"status": False, "error": f"{e}"}, status_code=500)
+
+
+@app.post(
+    "/predict/matrix",
+    response_model=QuoteMatrixResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": QuoteMatrixRequest.model_json_schema()}},
+        }
+    },
+)
+async def predictMatrixRouteClient(request: Request):
+    try:
+        with stage_timer("parse_json"):
+            matrix_request = QuoteMatrixRequest.model_validate_json(await request.body())
+            shipping_data = shippingData(**matrix_request.base.model_dump())
+            variant_records = shipping_data.get_variant_records(matrix_request.vary)
+
+    except ValidationError as e:
+        ERRORS_TOTAL.labels("/predict/matrix", type(e).__name__).inc()
+        return FastJSONResponse(
+            {"status": False, "error": e.errors(include_url=False, include_context=False, include_input=False)},
+            status_code=422,
+        )
+
+    except ValueError as e:
+        ERRORS_TOTAL.labels("/predict/matrix", type(e).__name__).inc()
+        return FastJSONResponse({"status": False, "error": f"{e}"}, status_code=422)
+
+    try:
+        # Every variant is scored in one vectorized call instead of one request per combination
+        with stage_timer("predict_batch"):
+            cost_values = await inference_executor.predict_batch(X=variant_records)
+
+        shape = [len(values) for values in matrix_request.vary.values()]
+        return FastJSONResponse(
+            {
+                "status": True,
+                "model_version": inference_executor.model_version,
+                "axes": matrix_request.vary,
+                "prices": cost_values.round(2).reshape(shape).tolist(),
+            }
+        )
+
+    except InferenceRejectedException as e:
+        ERRORS_TOTAL.labels("/predict/matrix", type(e).__name__).inc()
+        return FastJSONResponse({"status": False, "error": f"{e}"}, status_code=503)
+
+    except Exception as e:
+        ERRORS_TOTAL.labels("/predict/matrix", type(e).__name__).inc()
+        return FastJSONResponse({"status": False, "error": f"{e}"}, status_code=500)
+
+
+async def read_batch_data_frame(request: Request) -> pd.DataFrame:
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise ValueError("Expected a CSV upload in the 'file' form field")
+        return pd.read_csv(upload.file)
+
+    if content_type.startswith("text/csv"):
+        return pd.read_csv(io.BytesIO(await request.body()))
+
+    payload = await request.json()
+    if isinstance(payload, dict):
+        payload = payload.get("shipments")
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of shipments")
+    return pd.DataFrame.from_records(payload)
+
+
+@app.post("/predict/batch")
+async def predictBatchRouteClient(request: Request):
+    try:
+        with stage_timer("parse_batch"):
+            batch_df = shippingData.get_batch_data_frame(await read_batch_data_frame(request))
+
+    except ValueError as e:
+        ERRORS_TOTAL.labels("/predict/batch", type(e).__name__).inc()
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=400)
+
+    try:
+        with stage_timer("predict_batch"):
+            cost_values = await inference_executor.predict_batch(X=batch_df, deadline_ms=None)
+
+        return {
+            "status": True,
+            "model_version": inference_executor.model_version,
+            "predictions": cost_values.round(2).tolist(),
+        }
+
+    except InferenceRejectedException as e:
+        ERRORS_TOTAL.labels("/predict/batch", type(e).__name__).inc()
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=503)
+
+    except Exception as e:
+        ERRORS_TOTAL.labels("/predict/batch", type(e).__name__).inc()
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=500)
+
+
+@app.post("/predict/stream")
+async def predictStreamRouteClient(request: Request):
+    # Results of each chunk are sent while the rest of the upload is still being read, clients have
+    # to read the response while they upload or both sides stall once the socket buffers are full
+    async def stream_results():
+        try:
+            async for result_chunk in stream_scorer.score(request.stream()):
+                yield result_chunk
+        except ClientDisconnect:
+            logging.info("Client disconnected from /predict/stream")
+        except ValueError as e:
+            ERRORS_TOTAL.labels("/predict/stream", type(e).__name__).inc()
+            yield dumps({"status": False, "error": f"{e}"}) + b"\n"
+
+    return DuplexStreamingResponse(
+        stream_results(),
+        media_type="application/x-ndjson",
+        headers={"X-Model-Version": inference_executor.model_version or ""},
+    )
+
+
+@app.post("/predict/arrow")
+async def predictArrowRouteClient(request: Request):
+    try:
+        from shipment.component.arrow_scoring import (
+            ARROW_STREAM_MEDIA_TYPE,
+            ArrowBatchScorer,
+            ArrowPredictionWriter,
+        )
+
+        arrow_scorer = ArrowBatchScorer()
+
+    except ImportError as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=501)
+
+    # The upload is spooled to disk past the memory limit and decoded one batch at a time
+    body = tempfile.SpooledTemporaryFile(max_size=ARROW_SPOOL_MAX_MEMORY_MB * 1024 * 1024)
+    try:
+        with stage_timer("read_arrow"):
+            # Writes may go to disk, they run off the event loop a megabyte of chunks at a time
+            pending_chunks, pending_bytes = [], 0
+            async for chunk in request.stream():
+                pending_chunks.append(chunk)
+                pending_bytes += len(chunk)
+                if pending_bytes >= 1024 * 1024:
+                    await asyncio.to_thread(body.write, b"".join(pending_chunks))
+                    pending_chunks, pending_bytes = [], 0
+            await asyncio.to_thread(body.write, b"".join(pending_chunks))
+            body.seek(0)
+            model_inputs = await asyncio.to_thread(arrow_scorer.open_batches, body)
+
+    except Exception as e:
+        body.close()
+        ERRORS_TOTAL.labels("/predict/arrow", type(e).__name__).inc()
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=400)
+
+    async def stream_predictions():
+        # Every input batch is answered with a batch of predictions as soon as it is scored, the
+        # next one is only decoded once the client has taken the previous one
+        n_rows = 0
+        try:
+            prediction_writer = ArrowPredictionWriter()
+            while True:
+                batch_df = await asyncio.to_thread(next, model_inputs, None)
+                if batch_df is None:
+                    break
+                with stage_timer("predict_batch"):
+                    cost_values = await inference_executor.predict_batch(X=batch_df, deadline_ms=None)
+                n_rows += len(cost_values)
+                yield prediction_writer.write(cost_values)
+            yield prediction_writer.close()
+            logging.info(f"Scored {n_rows} rows from an Arrow upload")
+
+        except Exception as e:
+            # The status line is already sent, the client sees a truncated stream without its end marker
+            ERRORS_TOTAL.labels("/predict/arrow", type(e).__name__).inc()
+            logging.error(f"Arrow scoring failed after {n_rows} rows: {e}")
+            raise
+
+        finally:
+            body.close()
+
+    return StreamingResponse(
+        stream_predictions(),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={"X-Model-Version": inference_executor.model_version or ""},
+    )
+
+
+@app.get("/cache/stats")
+async def cacheStatsRouteClient():
+    return prediction_cache.stats()
+
+
+@app.get("/live")
+async def liveRouteClient():
+    return {"status": "alive"}
+
+
+@app.get("/ready")
+async def readyRouteClient():
+    if not getattr(app.state, "ready", False):
+        return JSONResponse({"status": "warming up"}, status_code=503)
+    return {"status": "ready", "model_version": inference_executor.model_version}
+
+
+@app.get("/metrics")
+async def metricsRouteClient():
+    # The model version is read at scrape time, a hot reload replaces the label
+    model_version = inference_executor.model_version
+    MODEL_INFO.clear()
+    MODEL_INFO.labels(model_version or "none").set(1)
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/debug/profile")
+async def profileRouteClient(
+    request: Request,
+    mode: str = "cpu",
+    seconds: float = 10,
+    interval_ms: float = 5,
+    include_idle: bool = False,
+    top: int = 50,
+    group_by: str = "traceback",
+    format: str = "json",
+):
+    # Not served at all unless a token is configured
+    if PROFILING_TOKEN is None:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    authorization = request.headers.get("authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {PROFILING_TOKEN}".encode()):
+        return JSONResponse(
+            {"status": False, "error": "Invalid profiling token"},
+            status_code=401,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if mode not in ("cpu", "memory"):
+        return JSONResponse({"status": False, "error": f"Unknown mode {mode}"}, status_code=422)
+    if not 0 < seconds <= PROFILING_MAX_SECONDS or interval_ms <= 0:
+        return JSONResponse(
+            {
+                "status": False,
+                "error": f"seconds must be in (0, {PROFILING_MAX_SECONDS:g}] and interval_ms positive",
+            },
+            status_code=422,
+        )
+
+    try:
+        # Runs in a thread, the event loop keeps serving the traffic being profiled
+        file_name = f"{mode}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+        if mode == "cpu":
+            collapsed = await asyncio.to_thread(
+                service_profiler.profile_cpu, seconds, interval_ms / 1000, include_idle
+            )
+            return Response(
+                collapsed,
+                media_type="text/plain",
+                headers={"Content-Disposition": f'attachment; filename="{file_name}"'},
+            )
+
+        memory_profile = await asyncio.to_thread(service_profiler.profile_memory, seconds, top, group_by)
+        if format == "collapsed":
+            return Response(
+                memory_profile["collapsed"],
+                media_type="text/plain",
+                headers={"Content-Disposition": f'attachment; filename="{file_name}"'},
+            )
+        memory_profile.pop("collapsed")
+        return FastJSONResponse({"status": True, "pid": os.getpid(), **memory_profile})
+
+    except ProfilerBusyException as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=409)
+
+    except ValueError as e:
+        return JSONResponse({"status": False, "error": f"{e}"}, status_code=422)
 
 
 @app.get("/")
@@ -142,4 +587,10 @@ async def root():
 
 
 if __name__ == "__main__":
-    app_run(app, host=APP_HOST, port=APP_PORT)
\ No newline at end of file
+    if APP_WORKERS > 1:
+        # Loads the model once and forks the workers, which share its memory
+        from shipment.component.prefork_server import PreforkServer
+
+        PreforkServer(app, cost_predictor, workers=APP_WORKERS).run()
+    else:
+        app_run(app, host=APP_HOST, port=APP_PORT)
\ No newline at end of file
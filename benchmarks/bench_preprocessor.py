@@ -0,0 +1,55 @@
+"""
+Parity check and latency benchmark of CompiledPreprocessor against the fitted ColumnTransformer,
+on the notebook/shipment.csv data.
+
+Usage: python -m benchmarks.bench_preprocessor [--repeat N] [--batch-rows N]
+"""
+import argparse
+import numpy as np
+from benchmarks.standin_model import get_preprocessor, load_shipment_data
+from benchmarks.timing import time_per_call
+from shipment.component.model_predictor import shippingData
+from shipment.component.preprocessor_compiler import PreprocessorCompiler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    X, _ = load_shipment_data()
+    preprocessor = get_preprocessor().fit(X)
+    compiler = PreprocessorCompiler()
+    compiled = compiler.compile(preprocessor)
+    compiler.verify(compiled, preprocessor, X)
+
+    # Unknown and missing categories take the fallback rows of the lookup tables
+    edge_cases = X.head(3).copy()
+    edge_cases.loc[0, "Material"] = "Unobtainium"
+    edge_cases.loc[1, "Transport"] = None
+    edge_cases.loc[2, "Material"] = None
+    compiler.verify(compiled, preprocessor, edge_cases)
+
+    row = X.head(1)
+    record = shippingData.get_batch_data_frame(row).to_records(index=False)
+    record = record.astype(shippingData.RECORD_DTYPE)
+    if compiled.transform(record).tobytes() != preprocessor.transform(row).tobytes():
+        raise AssertionError("Compiled preprocessor output differs on a record array")
+    print(f"{compiled}: identical output on {len(X)} rows, unknown and missing values and records")
+
+    batch = X.iloc[np.arange(args.batch_rows) % len(X)].reset_index(drop=True)
+    out = np.empty((1, compiled.n_features_out))
+    results = {
+        "single row, ColumnTransformer": time_per_call(lambda: preprocessor.transform(row), args.repeat),
+        "single row, compiled DataFrame": time_per_call(lambda: compiled.transform(row), args.repeat),
+        "single row, compiled record": time_per_call(lambda: compiled.transform(record, out), args.repeat),
+        f"{len(batch)} rows, ColumnTransformer": time_per_call(lambda: preprocessor.transform(batch), args.repeat),
+        f"{len(batch)} rows, compiled DataFrame": time_per_call(lambda: compiled.transform(batch), args.repeat),
+    }
+    for name, micros in results.items():
+        print(f"{name:<36}{micros:12.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Microbenchmark of the per request input path of POST /predict.
+
+Compares the string DataFrame built by the previous shippingData.get_input_data_frame with the typed
+record from shippingData.get_input_record, and checks that both give byte identical predictions.
+
+Usage: python -m benchmarks.bench_shipping_data [--rows N] [--repeat N]
+"""
+import argparse
+import numpy as np
+import pandas as pd
+from benchmarks.standin_model import build_standin_model, sample_shipments
+from benchmarks.timing import time_per_call
+from shipment.component.model_predictor import CostPredictor, shippingData
+
+
+def to_form(row: pd.Series) -> dict:
+    # Form fields arrive as strings keyed by attribute name
+    return {attribute: str(row[column]) for attribute, column in shippingData.COLUMNS.items()}
+
+
+def string_data_frame(form: dict) -> pd.DataFrame:
+    # What the DataForm copy and the untyped shippingData.get_data used to build
+    return pd.DataFrame({column: [form[attribute]] for attribute, column in shippingData.COLUMNS.items()})
+
+
+def typed_record(form: dict) -> np.ndarray:
+    return shippingData.from_mapping(form).get_input_record()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model = build_standin_model()
+    forms = [to_form(row) for _, row in sample_shipments(args.rows).iterrows()]
+
+    def predict_string(form):
+        return model.predict(string_data_frame(form))
+
+    def predict_record(form):
+        return model.predict(CostPredictor.get_model_input(model, typed_record(form)))
+
+    for form in forms:
+        expected, actual = predict_string(form), predict_record(form)
+        if expected.tobytes() != actual.tobytes():
+            raise AssertionError(f"Prediction mismatch for {form}: {expected} != {actual}")
+    print(f"Predictions are byte identical on {len(forms)} rows")
+
+    calls = [(form,) for form in forms]
+    results = {
+        "input, string DataFrame": time_per_call(string_data_frame, args.repeat, calls),
+        "input, typed record": time_per_call(typed_record, args.repeat, calls),
+        "predict, string DataFrame": time_per_call(predict_string, args.repeat, calls),
+        "predict, typed record": time_per_call(predict_record, args.repeat, calls),
+    }
+    for name, micros in results.items():
+        print(f"{name:<28}{micros:10.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
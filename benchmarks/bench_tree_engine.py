@@ -0,0 +1,45 @@
+"""
+Parity check and latency benchmark of CompiledTreeEnsemble against the original tree ensembles,
+trained on the preprocessed notebook/shipment.csv data.
+
+Usage: python -m benchmarks.bench_tree_engine [--repeat N] [--batch-rows N]
+"""
+import argparse
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from xgboost import XGBRegressor
+from benchmarks.standin_model import get_preprocessor, load_shipment_data
+from benchmarks.timing import time_per_call
+from shipment.component.model_compiler import TreeEnsembleCompiler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    X, y = load_shipment_data()
+    transformed = get_preprocessor().fit_transform(X)
+    transformed = transformed.toarray() if hasattr(transformed, "toarray") else transformed
+    batch = transformed[np.arange(args.batch_rows) % len(transformed)]
+
+    compiler = TreeEnsembleCompiler()
+    models = [
+        XGBRegressor(n_estimators=200, max_depth=6, random_state=42),
+        RandomForestRegressor(n_estimators=100, max_depth=12, random_state=42),
+        GradientBoostingRegressor(n_estimators=200, random_state=42),
+    ]
+    for model in models:
+        model.fit(transformed, y)
+        compiled = compiler.compile(model)
+        max_difference = compiler.verify(compiled, model, transformed)
+        print(f"{compiled}: max difference {max_difference:.3g} on {len(transformed)} rows")
+        for name, rows in (("single row", transformed[:1]), (f"{len(batch)} rows", batch)):
+            original = time_per_call(model.predict, args.repeat, [(rows,)])
+            flat = time_per_call(compiled.predict, args.repeat, [(rows,)])
+            print(f"  {name:<12} original {original:12.1f} us   compiled {flat:12.1f} us")
+
+
+if __name__ == "__main__":
+    main()
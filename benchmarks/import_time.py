@@ -0,0 +1,139 @@
+"""
+Cold start benchmark: imports a module in fresh interpreters with `python -X importtime`, and writes
+the total and the slowest modules to JSON. When given a baseline JSON from an earlier run, exits
+non-zero if the import got slower than the allowed regression or pulled in a training-only module.
+
+The report goes to the temporary directory unless --output names another file.
+
+Usage: python -m benchmarks.import_time [--module app] [--runs N] [--output import_time.json]
+                                        [--baseline previous.json] [--max-regression 0.2]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Training and cloud dependencies that the serving path must only load on first use of /train
+TRAINING_ONLY_MODULES = (
+    "boto3",
+    "botocore",
+    "mypy_boto3_s3",
+    "pymongo",
+    "evidently",
+    "xgboost",
+    "catboost",
+    "dill",
+    "category_encoders",
+    "sklearn",
+)
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def parse_import_time(stderr: str) -> List[Dict]:
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append(
+                {
+                    "module": name,
+                    "self_us": int(self_us),
+                    "cumulative_us": int(cumulative_us),
+                    "depth": (len(indent) - 1) // 2,
+                }
+            )
+    return modules
+
+
+def measure(module: str) -> List[Dict]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_import_time(result.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--output", default=os.path.join(tempfile.gettempdir(), "import_time.json"))
+    parser.add_argument("--baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # The fastest run of each module filters out noise from the rest of the machine
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best: Dict[str, Dict] = {}
+    for modules in runs:
+        for entry in modules:
+            previous = best.get(entry["module"])
+            if previous is None or entry["cumulative_us"] < previous["cumulative_us"]:
+                best[entry["module"]] = entry
+
+    totals = [
+        next(entry["cumulative_us"] for entry in modules if entry["module"] == args.module)
+        for modules in runs
+    ]
+    loaded = set(best)
+    report = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "total_us": min(totals),
+        "total_us_per_run": totals,
+        "n_modules": len(best),
+        "training_only_modules": sorted(
+            name
+            for name in loaded
+            if name.split(".")[0] in TRAINING_ONLY_MODULES and "." not in name
+        ),
+        "slowest_top_level": sorted(
+            (entry for entry in best.values() if entry["depth"] <= 1),
+            key=lambda entry: entry["cumulative_us"],
+            reverse=True,
+        )[: args.top],
+        "slowest_self": sorted(best.values(), key=lambda entry: entry["self_us"], reverse=True)[
+            : args.top
+        ],
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print(f"import {args.module}: {report['total_us'] / 1000:.1f} ms, {report['n_modules']} modules")
+    print(f"report written to {args.output}")
+    for entry in report["slowest_top_level"][:10]:
+        print(f"  {entry['cumulative_us'] / 1000:8.1f} ms  {entry['module']}")
+
+    failures = []
+    if report["training_only_modules"]:
+        failures.append(f"training only modules imported: {', '.join(report['training_only_modules'])}")
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        allowed = baseline["total_us"] * (1 + args.max_regression)
+        print(f"baseline: {baseline['total_us'] / 1000:.1f} ms, allowed: {allowed / 1000:.1f} ms")
+        if report["total_us"] > allowed:
+            failures.append(
+                f"import time {report['total_us'] / 1000:.1f} ms exceeds {allowed / 1000:.1f} ms"
+            )
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Load test of the prediction service: starts app.py as a subprocess (or in this process, or uses a
+running server given by --url) with a stand-in model trained on notebook/shipment.csv, drives the
+prediction routes at each concurrency level for a fixed duration and reports throughput and
+p50/p95/p99 latency per route. Results are written to JSON; when given a baseline JSON from an earlier
+run, exits non-zero if p95 latency or throughput regressed by more than the allowed fraction.
+
+Usage: python -m benchmarks.load_test [--scenarios predict_json,predict_batch] [--concurrency 1,8,32]
+                                      [--duration 10] [--workers N] [--in-process] [--url URL]
+                                      [--output load_test.json] [--baseline previous.json]
+                                      [--max-regression 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_shipments(n_rows: int) -> List[Dict]:
+    # Distinct rows of the data set keyed by attribute name, so the prediction cache sees real traffic
+    from benchmarks.standin_model import sample_shipments
+    from shipment.component.model_predictor import shippingData
+
+    attributes = {column: attribute for attribute, column in shippingData.COLUMNS.items()}
+    frame = sample_shipments(n_rows).rename(columns=attributes)
+    return frame[list(attributes.values())].to_dict(orient="records")
+
+
+class Scenario:
+    def __init__(self, name: str, method: str, path: str, build: Callable, is_ok: Callable, rows: int = 1):
+        self.name = name
+        self.method = method
+        self.path = path
+        # Builds the keyword arguments of the request from a rolling row offset
+        self.build = build
+        self.is_ok = is_ok
+        self.rows = rows
+
+
+def is_json_ok(response: httpx.Response) -> bool:
+    return response.status_code == 200 and response.json().get("status") is not False
+
+
+def is_html_ok(response: httpx.Response) -> bool:
+    return response.status_code == 200 and response.headers.get("content-type", "").startswith("text/html")
+
+
+def get_scenarios(shipments: List[Dict], batch_rows: int) -> Dict[str, Scenario]:
+    n_shipments = len(shipments)
+
+    def row(offset: int) -> Dict:
+        return shipments[offset % n_shipments]
+
+    def batch(offset: int) -> List[Dict]:
+        start = (offset * batch_rows) % n_shipments
+        return [shipments[(start + index) % n_shipments] for index in range(batch_rows)]
+
+    matrix_axes = {
+        "transport": ["Airways", "Roadways", "Waterways"],
+        "expressShipment": ["Yes", "No"],
+        "international": ["Yes", "No"],
+        "installationIncluded": ["Yes", "No"],
+    }
+    return {
+        "predict_get": Scenario("predict_get", "GET", "/predict", lambda offset: {}, is_html_ok),
+        "predict_form": Scenario(
+            "predict_form", "POST", "/predict", lambda offset: {"data": row(offset)}, is_html_ok
+        ),
+        "predict_json": Scenario(
+            "predict_json", "POST", "/predict/json", lambda offset: {"json": row(offset)}, is_json_ok
+        ),
+        "predict_batch": Scenario(
+            "predict_batch",
+            "POST",
+            "/predict/batch",
+            lambda offset: {"json": batch(offset)},
+            is_json_ok,
+            rows=batch_rows,
+        ),
+        "predict_matrix": Scenario(
+            "predict_matrix",
+            "POST",
+            "/predict/matrix",
+            lambda offset: {"json": {"base": row(offset), "vary": matrix_axes}},
+            is_json_ok,
+            rows=24,
+        ),
+    }
+
+
+async def run_level(base_url: str, scenario: Scenario, concurrency: int, duration: float, warmup: float) -> Dict:
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    failures = 0
+    offset = 0
+    measuring_from = time.perf_counter() + warmup
+    stop_at = measuring_from + duration
+
+    async def user(client: httpx.AsyncClient) -> None:
+        nonlocal failures, offset
+        while True:
+            offset += 1
+            request_kwargs = scenario.build(offset)
+            start = time.perf_counter()
+            if start >= stop_at:
+                return
+            try:
+                response = await client.request(scenario.method, scenario.path, **request_kwargs)
+                status = str(response.status_code)
+                ok = scenario.is_ok(response)
+            except (httpx.HTTPError, ValueError) as e:
+                status, ok = type(e).__name__, False
+            end = time.perf_counter()
+            if start < measuring_from:
+                continue
+            latencies.append(end - start)
+            status_codes[status] = status_codes.get(status, 0) + 1
+            failures += not ok
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await asyncio.gather(*[user(client) for _ in range(concurrency)])
+
+    latencies_ms = np.asarray(latencies) * 1000
+    n_requests = len(latencies)
+    p50, p90, p95, p99 = (
+        np.percentile(latencies_ms, [50, 90, 95, 99]) if n_requests else (float("nan"),) * 4
+    )
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "requests": n_requests,
+        "failures": failures,
+        "status_codes": status_codes,
+        "throughput_rps": n_requests / duration,
+        "rows_per_s": n_requests * scenario.rows / duration,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()) if n_requests else float("nan"),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(latencies_ms.max()) if n_requests else float("nan"),
+        },
+    }
+
+
+def get_free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before it was ready")
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} was not ready within {timeout:.0f} s")
+
+
+def start_subprocess(port: int, env: Dict[str, str], log_file) -> subprocess.Popen:
+    # Server output goes to a file, a pipe nobody reads during the run would block the server
+    return subprocess.Popen(
+        [sys.executable, "app.py"],
+        cwd=PROJECT_ROOT,
+        env={**os.environ, **env, "APP_HOST": "127.0.0.1", "APP_PORT": str(port)},
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def start_in_process(port: int, env: Dict[str, str]) -> Tuple[object, threading.Thread]:
+    # Shares the interpreter and the GIL with the load generator, meant for quick smoke runs
+    os.environ.update(env)
+    os.chdir(PROJECT_ROOT)
+    import uvicorn
+    from app import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def compare_with_baseline(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    failures = []
+    previous = {(level["scenario"], level["concurrency"]): level for level in baseline["results"]}
+    for level in report["results"]:
+        before = previous.get((level["scenario"], level["concurrency"]))
+        if before is None:
+            continue
+        name = f"{level['scenario']} at concurrency {level['concurrency']}"
+        if level["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + max_regression):
+            failures.append(
+                f"{name}: p95 {level['latency_ms']['p95']:.2f} ms, baseline {before['latency_ms']['p95']:.2f} ms"
+            )
+        if level["throughput_rps"] < before["throughput_rps"] * (1 - max_regression):
+            failures.append(
+                f"{name}: {level['throughput_rps']:.0f} req/s, baseline {before['throughput_rps']:.0f} req/s"
+            )
+    return failures
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scenarios", default="predict_get,predict_form,predict_json,predict_batch,predict_matrix"
+    )
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--batch-rows", type=int, default=100)
+    parser.add_argument("--distinct-rows", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--model", help="Model file to serve instead of a freshly trained stand-in")
+    parser.add_argument("--in-process", action="store_true")
+    parser.add_argument("--url", help="Load test a running server instead of starting one")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--output", default="load_test.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    shipments = get_shipments(args.distinct_rows)
+    scenarios = get_scenarios(shipments, args.batch_rows)
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        parser.error(f"Unknown scenarios {unknown}, choose from {sorted(scenarios)}")
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    process, server, model_dir, log_file = None, None, None, None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        model_path = args.model
+        if model_path is None:
+            from benchmarks.standin_model import save_standin_model
+
+            model_dir = tempfile.TemporaryDirectory()
+            model_path = save_standin_model(os.path.join(model_dir.name, "model.joblib"))
+            print(f"Trained stand-in model {model_path}")
+        port = get_free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = {"PREDICTION_MODEL_PATH": os.path.abspath(model_path), "APP_WORKERS": str(args.workers)}
+        if args.in_process:
+            server, _ = start_in_process(port, env)
+        else:
+            log_file = tempfile.TemporaryFile()
+            process = start_subprocess(port, env, log_file)
+
+    results = []
+    try:
+        wait_until_ready(base_url, args.startup_timeout, process)
+        for name in selected:
+            for concurrency in concurrency_levels:
+                level = asyncio.run(
+                    run_level(base_url, scenarios[name], concurrency, args.duration, args.warmup)
+                )
+                results.append(level)
+                latency = level["latency_ms"]
+                print(
+                    f"{name:<15} c={concurrency:<4} {level['throughput_rps']:8.1f} req/s "
+                    f"p50 {latency['p50']:7.2f} ms  p95 {latency['p95']:7.2f} ms  "
+                    f"p99 {latency['p99']:7.2f} ms  failures {level['failures']}"
+                )
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            if process.returncode not in (0, -15):
+                log_file.seek(0)
+                print(log_file.read().decode(errors="replace")[-2000:])
+            log_file.close()
+        if server is not None:
+            server.should_exit = True
+        if model_dir is not None:
+            model_dir.cleanup()
+
+    report = {
+        "commit": get_git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "mode": "url" if args.url else "in-process" if args.in_process else "subprocess",
+        "workers": args.workers,
+        "args": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Wrote {args.output}")
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            failures = compare_with_baseline(report, json.load(baseline_file), args.max_regression)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Stand-in CostModel trained on notebook/shipment.csv, for benchmarks that need a real model
+without the MongoDB / S3 training pipeline.
+"""
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from category_encoders.binary import BinaryEncoder
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from xgboost import XGBRegressor
+from shipment.component.model_predictor import shippingData
+from shipment.component.model_compiler import TreeEnsembleCompiler
+from shipment.component.model_trainer import CostModel
+from shipment.component.preprocessor_compiler import PreprocessorCompiler
+from shipment.constant import PREDICTION_MODEL_PATH, TARGET_COLUMN
+
+DATA_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "notebook", "shipment.csv")
+
+NUMERICAL_COLUMNS = shippingData.NUMERICAL_COLUMNS
+ONEHOT_COLUMNS = [
+    "International",
+    "Express Shipment",
+    "Installation Included",
+    "Transport",
+    "Fragile",
+    "Customer Information",
+    "Remote Location",
+]
+BINARY_COLUMNS = ["Material"]
+
+
+def load_shipment_data(file_path: str = DATA_FILE_PATH):
+    df = pd.read_csv(file_path)
+    df = df[list(shippingData.COLUMNS.values()) + [TARGET_COLUMN]].dropna()
+    return df.drop(columns=[TARGET_COLUMN]).reset_index(drop=True), df[TARGET_COLUMN].to_numpy()
+
+
+def get_preprocessor() -> ColumnTransformer:
+    # Same layout as DataTransformation.get_data_transformer_object
+    return ColumnTransformer(
+        [
+            ("OneHotEncoder", OneHotEncoder(handle_unknown="ignore"), ONEHOT_COLUMNS),
+            ("BinaryEncoder", BinaryEncoder(), BINARY_COLUMNS),
+            ("StandardScaler", StandardScaler(), NUMERICAL_COLUMNS),
+        ]
+    )
+
+
+def build_standin_model(estimator=None, file_path: str = DATA_FILE_PATH, compiled: bool = True) -> CostModel:
+    X, y = load_shipment_data(file_path)
+    preprocessor = get_preprocessor()
+    transformed = preprocessor.fit_transform(X)
+    estimator = estimator or XGBRegressor(n_estimators=200, max_depth=6, random_state=42)
+    estimator.fit(transformed, y)
+    if not compiled:
+        return CostModel(preprocessor, estimator)
+    # Compiled like DataTransformation and ModelTrainer do at the end of training
+    return CostModel(
+        preprocessor,
+        estimator,
+        TreeEnsembleCompiler().compile(estimator),
+        PreprocessorCompiler().compile(preprocessor),
+    )
+
+
+def save_standin_model(model_path: str = PREDICTION_MODEL_PATH, estimator=None, compiled: bool = True) -> str:
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    joblib.dump(build_standin_model(estimator, compiled=compiled), model_path)
+    return model_path
+
+
+def sample_shipments(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    X, _ = load_shipment_data()
+    return X.sample(n_rows, replace=n_rows > len(X), random_state=seed).reset_index(drop=True)
@@ -0,0 +1,18 @@
+"""
+Timing helper shared by the microbenchmarks.
+"""
+import time
+from typing import Callable, Sequence
+
+
+def time_per_call(function: Callable, repeat: int, calls: Sequence[tuple] = ((),)) -> float:
+    # Best of repeat rounds in microseconds per call, a round calls function once per argument
+    # tuple in calls, after one call to warm up
+    function(*calls[0])
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arguments in calls:
+            function(*arguments)
+        best = min(best, (time.perf_counter() - start) / len(calls))
+    return best * 1e6
@@ -0,0 +1 @@
+# Puts the repository root on sys.path, so the tests import shipment and benchmarks as the app does
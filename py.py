@@ -1,2 +0,0 @@
-import category_encoders
-print(category_encoders.__version__)
\ No newline at end of file
@@ -0,0 +1,160 @@
+import sys
+from typing import BinaryIO, Dict, Iterator, List
+import numpy as np
+import pandas as pd
+from shipment.component.model_predictor import shippingData
+from shipment.constant import ARROW_BATCH_ROWS
+from shipment.exception import shippingException
+from shipment.logger import logging
+
+# pyarrow is optional, without it /predict/arrow answers 501
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MAGIC = b"PAR1"
+ARROW_FILE_MAGIC = b"ARROW1"
+
+
+class _ChunkSink:
+    # File object for the IPC writer that hands every written message over to the response
+    closed = False
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+class ArrowPredictionWriter:
+    def __init__(self):
+        self.schema = pa.schema([("cost", pa.float64())])
+        self._sink = _ChunkSink()
+        self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def write(self, predictions: np.ndarray) -> bytes:
+        # One record batch per input batch, the first call also returns the schema message
+        self._writer.write_batch(
+            pa.record_batch([pa.array(predictions, type=pa.float64())], schema=self.schema)
+        )
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.take()
+
+
+class ArrowBatchScorer:
+    def __init__(self, batch_rows: int = ARROW_BATCH_ROWS):
+        if pa is None:
+            raise ImportError("pyarrow is required to score Arrow and Parquet uploads")
+        self.batch_rows = batch_rows
+
+    def open_batches(self, body: BinaryIO) -> Iterator[pd.DataFrame]:
+
+        """
+        Method Name :   open_batches
+
+        Description :   This method opens an Arrow IPC stream, an Arrow IPC file or a Parquet file,
+                        told apart by their magic bytes, and checks its schema against the columns of
+                        shippingData before anything is scored. Batches are decoded lazily, at most
+                        batch_rows rows at a time, so memory does not grow with the upload.
+
+        Output      :   Iterator of model input DataFrames
+        """
+        logging.info("Entered the open_batches method of ArrowBatchScorer class")
+        magic = body.read(len(ARROW_FILE_MAGIC))
+        body.seek(0)
+
+        if magic.startswith(PARQUET_MAGIC):
+            parquet_file = pq.ParquetFile(body)
+            source_columns = self.get_source_columns(parquet_file.schema_arrow)
+            record_batches = parquet_file.iter_batches(
+                batch_size=self.batch_rows, columns=list(source_columns.values())
+            )
+            input_format = "parquet"
+        elif magic == ARROW_FILE_MAGIC:
+            reader = pa.ipc.open_file(body)
+            source_columns = self.get_source_columns(reader.schema)
+            record_batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+            input_format = "arrow file"
+        else:
+            reader = pa.ipc.open_stream(body)
+            source_columns = self.get_source_columns(reader.schema)
+            record_batches = iter(reader)
+            input_format = "arrow stream"
+
+        logging.info(f"Reading {input_format} upload")
+        logging.info("Exited the open_batches method of ArrowBatchScorer class")
+        return self._iter_model_inputs(record_batches, source_columns)
+
+    @staticmethod
+    def get_source_columns(schema: "pa.Schema") -> Dict[str, str]:
+        # Columns may be named by model column or by attribute name, as for /predict/batch
+        names = set(schema.names)
+        source_columns = {}
+        for attribute, column in shippingData.COLUMNS.items():
+            if column in names:
+                source_columns[column] = column
+            elif attribute in names:
+                source_columns[column] = attribute
+        missing_columns = [
+            column for column in shippingData.COLUMNS.values() if column not in source_columns
+        ]
+        if missing_columns:
+            raise ValueError(f"Missing columns in batch: {missing_columns}")
+        return source_columns
+
+    def _iter_model_inputs(self, record_batches, source_columns: Dict[str, str]) -> Iterator[pd.DataFrame]:
+        for record_batch in record_batches:
+            # Slices share the buffers of the batch, they only bound the rows scored at once
+            for offset in range(0, record_batch.num_rows, self.batch_rows):
+                yield self.to_model_input(record_batch.slice(offset, self.batch_rows), source_columns)
+
+    @staticmethod
+    def to_model_input(record_batch: "pa.RecordBatch", source_columns: Dict[str, str]) -> pd.DataFrame:
+
+        """
+        Method Name :   to_model_input
+
+        Description :   This method converts a record batch to the model input without creating a
+                        python object per row. Numerical columns become float64 arrays and
+                        categorical columns pandas categoricals built from the dictionary encoded
+                        column, which the compiled preprocessor encodes per category. Nulls are scored
+                        as missing values.
+
+        Output      :   DataFrame with the model columns in order
+        """
+        try:
+            columns = {}
+            for column, source_column in source_columns.items():
+                array = record_batch.column(source_column)
+                if column in shippingData.NUMERICAL_COLUMNS:
+                    columns[column] = pc.cast(array, pa.float64()).to_numpy(zero_copy_only=False)
+                    continue
+                if pa.types.is_dictionary(array.type):
+                    if pa.types.is_string(array.type.value_type):
+                        columns[column] = array.to_pandas()
+                        continue
+                    array = array.dictionary_decode()
+                columns[column] = pc.cast(array, pa.string()).dictionary_encode().to_pandas()
+            return pd.DataFrame(columns, columns=list(source_columns))
+
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"Cannot convert batch to the model input: {e}") from e
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
@@ -3,7 +3,7 @@ import os
 from shipment.logger import logging
 from pandas import DataFrame
 from sklearn.model_selection import train_test_split
-from typing import Tuple
+from typing import Optional, Tuple
 from shipment.exception import shippingException
 from shipment.configuration.mongo_operation import mongoDBOperation
 from shipment.entity.config_entity import DataIngestionConfig
@@ -110,19 +110,20 @@ class DataIngestion:
             raise shippingException(e, sys) from e
 
     # This method initiates data ingestion
-    def initiate_data_ingestion(self) -> DataIngestionArtifacts:
+    def initiate_data_ingestion(self, df: Optional[DataFrame] = None) -> DataIngestionArtifacts:
 
         """
         Method Name :   initiate_data_ingestion
 
-        Description :   This method initiates data ingestion.
+        Description :   This method initiates data ingestion, on df when the collection was already fetched.
         
         Output      :   Data ingestion artifact 
         """
         logging.info("Entered initiate_data_ingestion method of Data_Ingestion class")
         try:
             # Getting data from MongoDB
-            df = self.get_data_from_mongodb()
+            if df is None:
+                df = self.get_data_from_mongodb()
 
             # Dropping the unnecessary columns from dataframe
             df1 = df.drop(self.data_ingestion_config.DROP_COLS, axis=1)
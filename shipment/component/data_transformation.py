@@ -4,15 +4,11 @@ import sys
 from pandas import DataFrame
 import numpy as np
 import pandas as pd
-try:
-    from category_encoders.binary import BinaryEncoder
-except ImportError:
-    logging.error("category_encoders package not found. Installing...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "category-encoders"])
-    from category_encoders.binary import BinaryEncoder
+from category_encoders.binary import BinaryEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from typing import Optional
+from shipment.component.preprocessor_compiler import CompiledPreprocessor, PreprocessorCompiler
 from shipment.entity.config_entity import DataTransformationConfig
 from shipment.entity.artifacts_entity import (
     DataIngestionArtifacts,
@@ -123,6 +119,31 @@ class DataTransformation:
         except Exception as e:
             raise shippingException(e, sys) from e
 
+    # This method is used to compile the fitted preprocessor for inference
+    def compile_preprocessor(
+        self, preprocessor: object, x_data: DataFrame
+    ) -> Optional[CompiledPreprocessor]:
+
+        """
+        Method Name :   compile_preprocessor
+
+        Description :   This method compiles the fitted preprocessor into lookup tables and a scaling
+                        op, and checks its output against the preprocessor on x_data.
+
+        Output      :   Compiled preprocessor or None
+        """
+        logging.info("Entered compile_preprocessor method of Data_Transformation class")
+        try:
+            compiler = PreprocessorCompiler()
+            compiled_preprocessor = compiler.compile(preprocessor)
+            compiler.verify(compiled_preprocessor, preprocessor, x_data)
+            logging.info("Compiled preprocessor matches the preprocessor")
+            return compiled_preprocessor
+
+        except Exception as e:
+            logging.info(f"Preprocessor is not compiled, it will be used as is for inference: {e}")
+            return None
+
     # This method is used to initialize data transformation
     def initiate_data_transformation(self) -> DataTransformationArtifacts:
 
@@ -231,6 +252,18 @@ class DataTransformation:
             logging.info(
                 "Saved the preprocessor object in DataTransformation artifacts directory."
             )
+
+            # Compiling the preprocessor, checked against the test features
+            compiled_preprocessor = self.compile_preprocessor(preprocessor, input_feature_test_df)
+            compiled_preprocessor_obj_file = None
+            if compiled_preprocessor is not None:
+                compiled_preprocessor_obj_file = self.data_transformation_config.UTILS.save_object(
+                    self.data_transformation_config.COMPILED_PREPROCESSOR_FILE_PATH,
+                    compiled_preprocessor,
+                )
+                logging.info(
+                    "Saved the compiled preprocessor object in DataTransformation artifacts directory."
+                )
             logging.info(
                 "Exited initiate_data_transformation method of Data_Transformation class"
             )
@@ -240,6 +273,7 @@ class DataTransformation:
                 transformed_object_file_path=preprocessor_obj_file,
                 transformed_train_file_path=transformed_train_file,
                 transformed_test_file_path=transformed_test_file,
+                compiled_object_file_path=compiled_preprocessor_obj_file,
             )
 
             return data_transformation_artifacts
@@ -0,0 +1,229 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+import numpy as np
+from pandas import DataFrame
+from shipment.component.model_predictor import CostPredictor
+from shipment.constant import (
+    INFERENCE_DEADLINE_MS,
+    INFERENCE_EXECUTOR_TYPE,
+    INFERENCE_MAX_QUEUE_DEPTH,
+    INFERENCE_MAX_WORKERS,
+    PREDICTION_MODEL_PATH,
+)
+from shipment.exception import InferenceRejectedException, shippingException
+from shipment.logger import logging
+from shipment.utils.metrics import INFERENCE_REJECTED_TOTAL, STAGE_LATENCY
+
+
+# These run inside the pool workers, module level so that process workers can unpickle them
+def _run_before_deadline(deadline: Optional[float], fn: Callable, *args) -> Tuple[float, object]:
+    start = time.time()
+    if deadline is not None and start > deadline:
+        raise InferenceRejectedException("Inference deadline passed while queued")
+    try:
+        result = fn(*args)
+    except shippingException as e:
+        # shippingException cannot be unpickled by a process pool, pass its message on instead
+        raise RuntimeError(str(e)) from None
+    return time.time() - start, result
+
+
+# The model version is returned with the predictions, process workers reload the model on their own
+def _predict(model_path: str, X: DataFrame) -> Tuple[float, Optional[str]]:
+    cost_predictor = CostPredictor(model_path)
+    return cost_predictor.predict(X), cost_predictor.current_model_version
+
+
+def _predict_batch(model_path: str, X: DataFrame) -> Tuple[np.ndarray, Optional[str]]:
+    cost_predictor = CostPredictor(model_path)
+    return cost_predictor.predict_batch(X), cost_predictor.current_model_version
+
+
+class InferenceExecutor:
+    # Weight of the latest call in the moving average of the service time
+    SERVICE_TIME_SMOOTHING = 0.2
+    # Seconds after which a service time estimate no call has updated counts half, so estimates that
+    # only rejected calls would update again wear off
+    SERVICE_TIME_HALF_LIFE = 5.0
+    # Single row and batch calls take very different times, each kind keeps its own estimate
+    CALL_KINDS = ("single", "batch")
+
+    def __init__(
+        self,
+        model_path: str = PREDICTION_MODEL_PATH,
+        executor_type: str = INFERENCE_EXECUTOR_TYPE,
+        max_workers: int = INFERENCE_MAX_WORKERS,
+        max_queue_depth: int = INFERENCE_MAX_QUEUE_DEPTH,
+        deadline_ms: Optional[float] = INFERENCE_DEADLINE_MS,
+    ):
+        if executor_type not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor type {executor_type}")
+        self.model_path = model_path
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.deadline_ms = deadline_ms
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pending_by_kind = {kind: 0 for kind in self.CALL_KINDS}
+        self._service_time: Dict[str, Optional[float]] = {kind: None for kind in self.CALL_KINDS}
+        self._service_time_updated = {kind: 0.0 for kind in self.CALL_KINDS}
+        # Version of the model that scored the latest call, only set from the event loop
+        self._model_version: Optional[str] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def model_version(self) -> Optional[str]:
+        # Before the first call the version loaded in this process, if any, e.g. by the warm up
+        if self._model_version is None:
+            return CostPredictor(self.model_path).current_model_version
+        return self._model_version
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_type == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.max_workers, thread_name_prefix="inference"
+                        )
+                    logging.info(
+                        f"Started {self.executor_type} inference executor with {self.max_workers} workers"
+                    )
+        return self._executor
+
+    def service_time(self, kind: str) -> float:
+        # Moving average of the service time of a kind of call, decayed by the time since its update
+        if self._service_time[kind] is None:
+            return 0.0
+        age = time.monotonic() - self._service_time_updated[kind]
+        return self._service_time[kind] * 0.5 ** (age / self.SERVICE_TIME_HALF_LIFE)
+
+    def estimate_wait(self, kind: str = "single") -> float:
+
+        """
+        Method Name :   estimate_wait
+
+        Description :   This method estimates how long a new call of the given kind waits and runs,
+                        from the pending calls of each kind and their moving average service times.
+                        A call that finds a free worker does not wait.
+
+        Output      :   Estimated seconds until the new call completes
+        """
+        if self._pending < self.max_workers:
+            return self.service_time(kind)
+        queued_work = sum(
+            self._pending_by_kind[pending_kind] * self.service_time(pending_kind)
+            for pending_kind in self.CALL_KINDS
+        )
+        # Calls beyond the free workers wait for the work ahead of them to be spread over the pool
+        return queued_work / self.max_workers + self.service_time(kind)
+
+    async def run(
+        self, fn: Callable, *args, deadline_ms: Optional[float] = -1, kind: str = "single"
+    ) -> object:
+
+        """
+        Method Name :   run
+
+        Description :   This method runs fn in the executor without blocking the event loop. Calls
+                        are rejected up front when the queue is full or when the estimated wait
+                        already exceeds the deadline, and abandoned once the deadline passes.
+                        A deadline_ms of None disables the deadline, -1 uses the default one.
+                        kind, single or batch, selects the service time estimate the call uses
+                        and updates.
+
+        Output      :   Return value of fn
+        """
+        if deadline_ms == -1:
+            deadline_ms = self.deadline_ms
+        deadline = None if deadline_ms is None else time.time() + deadline_ms / 1000
+
+        with self._lock:
+            if self._pending >= self.max_queue_depth:
+                INFERENCE_REJECTED_TOTAL.labels("queue_full").inc()
+                raise InferenceRejectedException(
+                    f"Inference queue is full with {self._pending} pending calls"
+                )
+            # Only calls that would queue are rejected on the estimate, a free worker always runs one
+            if (
+                deadline_ms is not None
+                and self._pending >= self.max_workers
+                and self.estimate_wait(kind) * 1000 > deadline_ms
+            ):
+                INFERENCE_REJECTED_TOTAL.labels("estimated_wait").inc()
+                raise InferenceRejectedException(
+                    f"Estimated inference wait exceeds the {deadline_ms:.0f} ms deadline"
+                )
+            self._pending += 1
+            self._pending_by_kind[kind] += 1
+
+        try:
+            future = self._get_executor().submit(_run_before_deadline, deadline, fn, *args)
+        except Exception:
+            self._on_done(kind, None)
+            raise
+        future.add_done_callback(functools.partial(self._on_done, kind))
+
+        submitted_at = time.perf_counter()
+        try:
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            elapsed, result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            INFERENCE_REJECTED_TOTAL.labels("deadline").inc()
+            raise InferenceRejectedException(
+                f"Inference did not complete within the {deadline_ms:.0f} ms deadline"
+            )
+        except InferenceRejectedException:
+            # Raised by the worker when the deadline passed while the call was queued
+            INFERENCE_REJECTED_TOTAL.labels("deadline").inc()
+            raise
+
+        self._update_service_time(kind, elapsed)
+        # Time from submission to completion that was not spent running fn, mostly waiting for a worker
+        total = time.perf_counter() - submitted_at
+        STAGE_LATENCY.labels("inference_queue").observe(max(total - elapsed, 0.0))
+        STAGE_LATENCY.labels("inference").observe(total)
+        return result
+
+    async def predict(self, X: DataFrame, deadline_ms: Optional[float] = -1) -> float:
+        prediction, self._model_version = await self.run(
+            _predict, self.model_path, X, deadline_ms=deadline_ms, kind="single"
+        )
+        return prediction
+
+    async def predict_batch(self, X: DataFrame, deadline_ms: Optional[float] = -1) -> np.ndarray:
+        predictions, self._model_version = await self.run(
+            _predict_batch, self.model_path, X, deadline_ms=deadline_ms, kind="batch"
+        )
+        return predictions
+
+    def _on_done(self, kind: str, future: Optional[Future]) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._pending_by_kind[kind] -= 1
+
+    def _update_service_time(self, kind: str, elapsed: float) -> None:
+        with self._lock:
+            # The average moves on from its decayed value, so a stale high estimate does not linger
+            if self._service_time[kind] is None:
+                self._service_time[kind] = elapsed
+            else:
+                current = self.service_time(kind)
+                self._service_time[kind] = current + self.SERVICE_TIME_SMOOTHING * (elapsed - current)
+            self._service_time_updated[kind] = time.monotonic()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,290 @@
+import json
+import sys
+from typing import List, Tuple
+import numpy as np
+from shipment.exception import shippingException
+from shipment.logger import logging
+
+
+class CompiledTreeEnsemble:
+    # Rows scored together in one pass over the trees
+    CHUNK_ROWS = 256
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        default_left: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        base_score: float,
+        divisor: float,
+        strict_split: bool,
+        source_model: str,
+    ):
+        # Nodes of all trees in contiguous arrays. Leaves point to themselves so that every row
+        # can be stepped down max_depth times regardless of the depth of the leaf it reaches.
+        # Leaf values are summed in their own dtype, float32 for XGBoost, starting from base_score
+        # and in tree order, then divided by divisor, exactly as the original library does.
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.base_score = value.dtype.type(base_score)
+        self.divisor = value.dtype.type(divisor)
+        self.strict_split = strict_split
+        self.source_model = source_model
+        # Left and right child of node i at 2 * i and 2 * i + 1
+        self.children = np.stack([left, right], axis=1).ravel()
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def predict(self, X) -> np.ndarray:
+
+        """
+        Method Name :   predict
+
+        Description :   This method scores rows with the flat trees, advancing a chunk of rows through
+                        all trees one level at a time. Features are compared as float32 like the original
+                        libraries do, missing values follow the default direction of each split. The
+                        predictions are bit for bit those of the original model.
+
+        Output      :   Predictions
+        """
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # float32 for XGBoost, like its own predictions, so that both round to the same cents
+        predictions = np.empty(len(X), dtype=self.value.dtype)
+        for start in range(0, len(X), self.CHUNK_ROWS):
+            chunk = X[start : start + self.CHUNK_ROWS]
+            predictions[start : start + len(chunk)] = self._predict_chunk(np.ascontiguousarray(chunk))
+        return predictions
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        # Small chunks keep the (rows, trees) node arrays in cache
+        values = X.ravel()
+        row_offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            x = values[row_offsets + self.feature[nodes]]
+            if self.strict_split:
+                go_right = ~(x < self.threshold[nodes])
+            else:
+                go_right = ~(x <= self.threshold[nodes])
+            missing = np.isnan(x)
+            if missing.any():
+                go_right = np.where(missing, ~self.default_left[nodes], go_right)
+            nodes = self.children[2 * nodes + go_right]
+        # A running sum adds the trees one after the other like the libraries, sum() would add them
+        # pairwise and round differently
+        leaf_values = self.value[nodes]
+        leaf_values[:, 0] += self.base_score
+        return np.cumsum(leaf_values, axis=1, dtype=leaf_values.dtype)[:, -1] / self.divisor
+
+    def __repr__(self):
+        return f"CompiledTreeEnsemble({self.source_model}, n_trees={self.n_trees}, max_depth={self.max_depth})"
+
+
+class TreeEnsembleCompiler:
+    # XGBoost objectives whose prediction is the raw margin
+    IDENTITY_OBJECTIVES = (
+        "reg:squarederror",
+        "reg:squaredlogerror",
+        "reg:pseudohubererror",
+        "reg:absoluteerror",
+        "reg:quantileerror",
+    )
+
+    def compile(self, model: object) -> CompiledTreeEnsemble:
+
+        """
+        Method Name :   compile
+
+        Description :   This method compiles a fitted XGBoost or sklearn tree ensemble regressor into
+                        a CompiledTreeEnsemble that scores without calling the original library.
+
+        Output      :   CompiledTreeEnsemble
+        """
+        logging.info("Entered the compile method of TreeEnsembleCompiler class")
+        try:
+            model_name = model.__class__.__name__
+            if hasattr(model, "get_booster"):
+                compiled = self._compile_xgboost(model)
+            elif model_name in ("RandomForestRegressor", "ExtraTreesRegressor"):
+                trees = [estimator.tree_ for estimator in model.estimators_]
+                compiled = self._from_sklearn_trees(trees, 0.0, 1.0, len(trees), model_name)
+            elif model_name == "GradientBoostingRegressor":
+                compiled = self._compile_gradient_boosting(model)
+            elif model_name in ("DecisionTreeRegressor", "ExtraTreeRegressor"):
+                compiled = self._from_sklearn_trees([model.tree_], 0.0, 1.0, 1.0, model_name)
+            else:
+                raise ValueError(f"Cannot compile model of type {model_name}")
+
+            logging.info(f"Compiled {compiled}")
+            logging.info("Exited the compile method of TreeEnsembleCompiler class")
+            return compiled
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
+
+    @staticmethod
+    def verify(compiled: CompiledTreeEnsemble, model: object, X) -> float:
+
+        """
+        Method Name :   verify
+
+        Description :   This method checks that the compiled ensemble reproduces the predictions of
+                        the original model on X exactly, so a shipment gets the same price whichever
+                        engine scores it.
+
+        Output      :   Largest absolute difference, raises when it is not zero
+        """
+        expected = np.ravel(model.predict(X)).astype(np.float64)
+        actual = compiled.predict(X)
+        max_difference = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+        if max_difference > 0:
+            raise ValueError(f"Compiled model differs from {compiled.source_model} by {max_difference}")
+        return max_difference
+
+    def _compile_xgboost(self, model: object) -> CompiledTreeEnsemble:
+        learner = json.loads(model.get_booster().save_raw(raw_format="json"))["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in self.IDENTITY_OBJECTIVES:
+            raise ValueError(f"Cannot compile XGBoost objective {objective}")
+        if int(learner["learner_model_param"].get("num_target", "1")) > 1:
+            raise ValueError("Cannot compile multi target XGBoost models")
+
+        gradient_booster = learner["gradient_booster"]
+        if gradient_booster["name"] != "gbtree":
+            raise ValueError(f"Cannot compile XGBoost booster {gradient_booster['name']}")
+        trees = gradient_booster["model"]["trees"]
+
+        # Models trained with early stopping predict with the trees up to the best iteration only
+        try:
+            best_iteration = model.best_iteration
+        except AttributeError:
+            best_iteration = None
+        if best_iteration is not None:
+            iteration_indptr = gradient_booster["model"].get("iteration_indptr")
+            if iteration_indptr:
+                trees = trees[: iteration_indptr[best_iteration + 1]]
+            else:
+                num_parallel_tree = int(
+                    gradient_booster["model"]["gbtree_model_param"]["num_parallel_tree"]
+                )
+                trees = trees[: (best_iteration + 1) * num_parallel_tree]
+
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+
+        nodes = []
+        for tree in trees:
+            left = np.asarray(tree["left_children"], dtype=np.int64)
+            is_leaf = left == -1
+            nodes.append(
+                (
+                    np.where(is_leaf, 0, tree["split_indices"]),
+                    np.where(is_leaf, 0, np.float32(tree["split_conditions"])),
+                    left,
+                    np.asarray(tree["right_children"], dtype=np.int64),
+                    np.asarray(tree["default_left"], dtype=bool),
+                    np.where(is_leaf, tree["split_conditions"], 0),
+                )
+            )
+        # XGBoost adds float32 leaf values to a float32 base score
+        return self._link(nodes, base_score, 1.0, True, model.__class__.__name__, np.float32)
+
+    def _compile_gradient_boosting(self, model: object) -> CompiledTreeEnsemble:
+        init = model.init_
+        if init == "zero":
+            base_score = 0.0
+        elif init.__class__.__name__ == "DummyRegressor":
+            base_score = float(np.ravel(init.constant_)[0])
+        else:
+            raise ValueError(f"Cannot compile GradientBoostingRegressor with init {init}")
+        trees = [estimator.tree_ for estimator in model.estimators_[:, 0]]
+        return self._from_sklearn_trees(
+            trees, base_score, model.learning_rate, 1.0, model.__class__.__name__
+        )
+
+    def _from_sklearn_trees(
+        self, trees: list, base_score: float, scale: float, divisor: float, source_model: str
+    ) -> CompiledTreeEnsemble:
+        # Leaf values are multiplied by scale, the learning rate of gradient boosting, before they
+        # are summed, and forests divide the sum by the number of trees, like sklearn does
+        nodes = []
+        for tree in trees:
+            left = tree.children_left.astype(np.int64)
+            is_leaf = left == -1
+            missing_go_to_left = getattr(tree, "missing_go_to_left", None)
+            nodes.append(
+                (
+                    np.where(is_leaf, 0, tree.feature),
+                    np.where(is_leaf, 0, tree.threshold),
+                    left,
+                    tree.children_right.astype(np.int64),
+                    np.ones(len(left), dtype=bool)
+                    if missing_go_to_left is None
+                    else missing_go_to_left.astype(bool),
+                    np.where(is_leaf, scale * tree.value[:, 0, 0], 0),
+                )
+            )
+        return self._link(nodes, base_score, divisor, False, source_model, np.float64)
+
+    @staticmethod
+    def _link(
+        nodes: List[Tuple[np.ndarray, ...]],
+        base_score: float,
+        divisor: float,
+        strict_split: bool,
+        source_model: str,
+        value_dtype: type,
+    ) -> CompiledTreeEnsemble:
+        # Concatenates the per tree node arrays, turning child indices into global ones
+        features, thresholds, lefts, rights, default_lefts, values, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for feature, threshold, left, right, default_left, value in nodes:
+            n_nodes = len(left)
+            own = np.arange(n_nodes)
+            is_leaf = left == -1
+            roots.append(offset)
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(np.where(is_leaf, own, left) + offset)
+            rights.append(np.where(is_leaf, own, right) + offset)
+            default_lefts.append(default_left)
+            values.append(value)
+
+            depth = np.zeros(n_nodes, dtype=np.int64)
+            for node in range(n_nodes):
+                if not is_leaf[node]:
+                    depth[left[node]] = depth[right[node]] = depth[node] + 1
+            max_depth = max(max_depth, int(depth.max()))
+            offset += n_nodes
+
+        return CompiledTreeEnsemble(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            default_left=np.concatenate(default_lefts),
+            value=np.concatenate(values).astype(value_dtype),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            base_score=base_score,
+            divisor=divisor,
+            strict_split=strict_split,
+            source_model=source_model,
+        )
@@ -12,6 +12,8 @@ from shipment.entity.artifacts_entity import (
 )
 from shipment.entity.config_entity import ModelEvaluationConfig
 
+# Default of the s3_model arguments, the champion model is then fetched by the evaluation itself
+S3_MODEL_NOT_FETCHED = object()
 
 
 @dataclass
@@ -67,12 +69,13 @@ class ModelEvaluation:
             raise shippingException(e, sys) from e
 
     # This method is used to evaluate the model
-    def evaluate_model(self) -> EvaluateModelResponse:
+    def evaluate_model(self, s3_model: object = S3_MODEL_NOT_FETCHED) -> EvaluateModelResponse:
 
         """
         Method Name :   evaluate_model
 
-        Description :   This method evaluates s3 bucket model and production model. 
+        Description :   This method evaluates s3 bucket model and production model, s3_model is the
+                        result of get_s3_model when it was fetched beforehand. 
         
         Output      :   This model give output about evaluation metric, whether model is accepted or not and the accuracy difference 
         """
@@ -97,7 +100,8 @@ class ModelEvaluation:
 
             # Loading the s3 model
             s3_model_r2_score = None
-            s3_model = self.get_s3_model()
+            if s3_model is S3_MODEL_NOT_FETCHED:
+                s3_model = self.get_s3_model()
             if s3_model is not None:
                 y_hat_s3_model = s3_model.predict(x)
                 s3_model_r2_score = self.model_evaluation_config.UTILS.get_model_score(
@@ -123,7 +127,7 @@ class ModelEvaluation:
             raise shippingException(e, sys) from e
 
     # This is method is used to initiate model evaluation
-    def initiate_model_evaluation(self) -> ModelEvaluationArtifact:
+    def initiate_model_evaluation(self, s3_model: object = S3_MODEL_NOT_FETCHED) -> ModelEvaluationArtifact:
 
         """
         Method Name :   initiate_model_evaluation
@@ -136,7 +140,7 @@ class ModelEvaluation:
             "Entered the initiate_model_evaluation methos of Model evaluation class"
         )
         try:
-            evaluate_model_reaponse = self.evaluate_model()
+            evaluate_model_reaponse = self.evaluate_model(s3_model)
 
             # saving model evaluation artifact
             model_evaluataion_artifact = ModelEvaluationArtifact(
@@ -1,16 +1,76 @@
 from shipment.logger import logging
 import sys
-from typing import Dict
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
 from pandas import DataFrame
 import pandas as pd
 import os
 import joblib
 from shipment.constant import *
 from shipment.exception import shippingException
+from shipment.utils.metrics import stage_timer
 import numpy as np
 
 
 class shippingData:
+    # Attribute name of every input field and the model column it is fed into
+    COLUMNS: Dict[str, str] = {
+        "artist": "Artist Reputation",
+        "height": "Height",
+        "width": "Width",
+        "weight": "Weight",
+        "material": "Material",
+        "priceOfSculpture": "Price Of Sculpture",
+        "baseShippingPrice": "Base Shipping Price",
+        "international": "International",
+        "expressShipment": "Express Shipment",
+        "installationIncluded": "Installation Included",
+        "transport": "Transport",
+        "fragile": "Fragile",
+        "customerInformation": "Customer Information",
+        "remoteLocation": "Remote Location",
+    }
+    NUMERICAL_COLUMNS = [
+        "Artist Reputation",
+        "Height",
+        "Width",
+        "Weight",
+        "Price Of Sculpture",
+        "Base Shipping Price",
+    ]
+    # Model input row, numerical columns as float64 and categorical columns as python strings
+    RECORD_DTYPE = np.dtype(
+        [
+            (column, np.float64 if is_numerical else object)
+            for column, is_numerical in zip(
+                COLUMNS.values(), map(NUMERICAL_COLUMNS.__contains__, COLUMNS.values())
+            )
+        ]
+    )
+
+    # Typical values of every field, cycled through to build synthetic rows for warming up the model
+    SAMPLE_VALUES: Dict[str, list] = {
+        "artist": [0.45, 0.26, 0.9],
+        "height": [20.0, 17.0, 35.0],
+        "width": [8.0, 6.0, 15.0],
+        "weight": [3102.0, 4128.0, 250.0],
+        "material": ["Brass", "Clay", "Aluminium", "Wood", "Marble", "Bronze", "Stone"],
+        "priceOfSculpture": [8.02, 13.91, 120.5],
+        "baseShippingPrice": [23.5, 16.27, 75.0],
+        "international": ["Yes", "No"],
+        "expressShipment": ["Yes", "No"],
+        "installationIncluded": ["No", "Yes"],
+        "transport": ["Airways", "Roadways", "Waterways"],
+        "fragile": ["No", "Yes"],
+        "customerInformation": ["Working Class", "Wealthy"],
+        "remoteLocation": ["No", "Yes"],
+    }
+
+    __slots__ = tuple(COLUMNS)
+
     def __init__(
         self,
         artist,
@@ -28,13 +88,14 @@ class shippingData:
         customerInformation,
         remoteLocation,
     ):
-        self.artist = artist
-        self.height = height
-        self.width = width
-        self.weight = weight
+        # Values are coerced once here, numerical fields arrive as strings from the form
+        self.artist = self._to_float("artist", artist)
+        self.height = self._to_float("height", height)
+        self.width = self._to_float("width", width)
+        self.weight = self._to_float("weight", weight)
         self.material = material
-        self.priceOfSculpture = priceOfSculpture
-        self.baseShippingPrice = baseShippingPrice
+        self.priceOfSculpture = self._to_float("priceOfSculpture", priceOfSculpture)
+        self.baseShippingPrice = self._to_float("baseShippingPrice", baseShippingPrice)
         self.international = international
         self.expressShipment = expressShipment
         self.installationIncluded = installationIncluded
@@ -43,6 +104,81 @@ class shippingData:
         self.customerInformation = customerInformation
         self.remoteLocation = remoteLocation
 
+    @staticmethod
+    def _to_float(name: str, value) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+    @classmethod
+    def from_mapping(cls, mapping) -> "shippingData":
+
+        """
+        Method Name :   from_mapping
+
+        Description :   This method builds shipping data straight from a form or dict keyed by attribute name.
+
+        Output      :   shippingData
+        """
+        return cls(*[mapping.get(attribute) for attribute in cls.COLUMNS])
+
+    def get_input_record(self, out: Optional[np.ndarray] = None, index: int = 0) -> np.ndarray:
+
+        """
+        Method Name :   get_input_record
+
+        Description :   This method writes the shipment as one row of RECORD_DTYPE, into out at index
+                        when a preallocated record array is given.
+
+        Output      :   Record array holding the row
+        """
+        if out is None:
+            out = np.empty(1, dtype=self.RECORD_DTYPE)
+        out[index] = (
+            self.artist,
+            self.height,
+            self.width,
+            self.weight,
+            self.material,
+            self.priceOfSculpture,
+            self.baseShippingPrice,
+            self.international,
+            self.expressShipment,
+            self.installationIncluded,
+            self.transport,
+            self.fragile,
+            self.customerInformation,
+            self.remoteLocation,
+        )
+        return out
+
+    def get_variant_records(self, axes: Dict[str, list]) -> np.ndarray:
+
+        """
+        Method Name :   get_variant_records
+
+        Description :   This method expands the shipment into every combination of the values in
+                        axes, keyed by attribute name. Rows are in row major order of the axes, so the
+                        predictions reshape to a grid with one dimension per axis.
+
+        Output      :   Record array with one row per variant
+        """
+        shape = [len(values) for values in axes.values()]
+        n_rows = int(np.prod(shape, dtype=np.int64))
+        records = np.empty(n_rows, dtype=self.RECORD_DTYPE)
+        records[:] = self.get_input_record()[0]
+        repeats = n_rows
+        for attribute, values in axes.items():
+            column = self.COLUMNS[attribute]
+            # Each value is repeated once per combination of the axes after it, the block is then
+            # tiled once per combination of the axes before it
+            repeats //= len(values)
+            records[column] = np.tile(
+                np.repeat(np.asarray(values, dtype=self.RECORD_DTYPE[column]), repeats),
+                n_rows // (len(values) * repeats),
+            )
+        return records
 
     def get_data(self) -> Dict:
 
@@ -104,11 +240,212 @@ class shippingData:
         except Exception as e:
             raise shippingException(e, sys) from e
 
+    @classmethod
+    def get_sample_records(cls, n_rows: int) -> np.ndarray:
+        # Synthetic rows from SAMPLE_VALUES, every category shows up once n_rows is large enough
+        records = np.empty(n_rows, dtype=cls.RECORD_DTYPE)
+        for attribute, column in cls.COLUMNS.items():
+            values = cls.SAMPLE_VALUES[attribute]
+            records[column] = [values[row % len(values)] for row in range(n_rows)]
+        return records
+
+    @classmethod
+    def get_batch_data_frame(cls, batch_df: DataFrame) -> DataFrame:
+
+        """
+        Method Name :   get_batch_data_frame
+
+        Description :   This method validates a batch of shipments against the columns of get_data.
+                        Columns may be given either by model column name or by attribute name.
+
+        Output      :   DataFrame with the model columns in order and numerical columns as float
+        """
+        logging.info("Entered get_batch_data_frame method of shippingData class")
+        batch_df = batch_df.rename(columns=cls.COLUMNS)
+        columns = list(cls.COLUMNS.values())
+
+        missing_columns = [column for column in columns if column not in batch_df.columns]
+        if missing_columns:
+            raise ValueError(f"Missing columns in batch: {missing_columns}")
+
+        batch_df = batch_df[columns]
+        null_columns = batch_df.columns[batch_df.isnull().any()].tolist()
+        if null_columns:
+            raise ValueError(f"Null values found in columns: {null_columns}")
+
+        for column in cls.NUMERICAL_COLUMNS:
+            try:
+                batch_df[column] = pd.to_numeric(batch_df[column]).astype(float)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Column {column} must be numeric: {e}") from e
+
+        categorical_columns = [column for column in columns if column not in cls.NUMERICAL_COLUMNS]
+        batch_df[categorical_columns] = batch_df[categorical_columns].astype(str)
+
+        logging.info("Exited get_batch_data_frame method of shippingData class")
+        return batch_df
+
+
+@dataclass
+class LoadedModel:
+    model: object
+    version: str
+    signature: Tuple[int, int]
+
+
+class ModelCache:
+    def __init__(
+        self,
+        model_path: str,
+        check_interval: float = MODEL_RELOAD_CHECK_INTERVAL,
+        mmap_mode: Optional[str] = MODEL_MMAP_MODE,
+    ):
+        self.model_path = model_path
+        self.check_interval = check_interval
+        self.mmap_mode = mmap_mode
+        self._lock = threading.Lock()
+        self._loaded: Optional[LoadedModel] = None
+        self._last_check = float("-inf")
+
+    def get(self) -> Optional[LoadedModel]:
+
+        """
+        Method Name :   get
+
+        Description :   This method returns the model shared by the whole process. The model file is
+                        checked at most once per check interval. A changed file is loaded by the
+                        request that noticed it and swapped in atomically, other requests keep
+                        using the previous model until then.
+
+        Output      :   Loaded model with its version, None if no model file exists
+        """
+        loaded = self._loaded
+        if loaded is not None and time.monotonic() - self._last_check < self.check_interval:
+            return loaded
+
+        # Only one thread reloads, the others keep serving the current model
+        if not self._lock.acquire(blocking=loaded is None):
+            return loaded
+        try:
+            if self._loaded is not loaded and self._loaded is not None:
+                return self._loaded
+            self._last_check = time.monotonic()
+            self._reload()
+            return self._loaded
+
+        finally:
+            self._lock.release()
+
+    @property
+    def current_version(self) -> Optional[str]:
+        # Version of the model loaded now, never checks the file, safe to read on the event loop
+        loaded = self._loaded
+        return None if loaded is None else loaded.version
+
+    def _reload(self) -> None:
+        try:
+            stat = os.stat(self.model_path)
+        except FileNotFoundError:
+            if self._loaded is not None:
+                logging.info(f"Model file {self.model_path} is missing, keeping model version {self._loaded.version}")
+            return
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        loaded = self._loaded
+        if loaded is not None and loaded.signature == signature:
+            return
+
+        try:
+            version = self.get_file_hash(self.model_path)
+            if loaded is not None and loaded.version == version:
+                # File was touched but its content is unchanged
+                self._loaded = LoadedModel(loaded.model, version, signature)
+                return
+
+            with stage_timer("model_load"):
+                model = self._load_model(version)
+            self._loaded = LoadedModel(model, version, signature)
+            logging.info(f"Loaded model version {version} from {self.model_path}")
+
+        except Exception as e:
+            if loaded is None:
+                raise shippingException(e, sys) from e
+            logging.error(f"Failed to reload model, keeping version {loaded.version}: {e}")
+
+    def _load_model(self, version: str) -> object:
+        if self.mmap_mode is None:
+            return joblib.load(self.model_path)
+
+        # Arrays can only be memory mapped from a file written by joblib.dump, the trained model is
+        # written with dill. A joblib copy is made once per version and shared by all processes.
+        model_dir, model_file = os.path.split(self.model_path)
+        mmap_path = os.path.join(model_dir, f".{model_file}.{version}.mmap")
+        if not os.path.exists(mmap_path):
+            temporary_path = f"{mmap_path}.{os.getpid()}.tmp"
+            joblib.dump(joblib.load(self.model_path), temporary_path)
+            os.replace(temporary_path, mmap_path)
+            logging.info(f"Wrote memory mappable copy of model version {version} to {mmap_path}")
+
+        # Copies of older versions can go, processes that still map them keep their pages
+        for file_name in os.listdir(model_dir or "."):
+            if file_name.startswith(f".{model_file}.") and file_name.endswith(".mmap"):
+                stale_path = os.path.join(model_dir, file_name)
+                if stale_path != mmap_path:
+                    try:
+                        os.remove(stale_path)
+                    except OSError:
+                        pass
+
+        return joblib.load(mmap_path, mmap_mode=self.mmap_mode)
+
+    @staticmethod
+    def get_file_hash(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file_obj:
+            for chunk in iter(lambda: file_obj.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()[:12]
+
+
+_model_caches: Dict[str, ModelCache] = {}
+_model_caches_lock = threading.Lock()
+
+
+def get_model_cache(model_path: str = PREDICTION_MODEL_PATH) -> ModelCache:
+    with _model_caches_lock:
+        model_path = os.path.abspath(model_path)
+        if model_path not in _model_caches:
+            _model_caches[model_path] = ModelCache(model_path)
+        return _model_caches[model_path]
+
 
 class CostPredictor:
-    def __init__(self):
-        # Use artifacts directory for model
-        self.model_path = os.path.join("artifacts", "model_trainer", "model.joblib")
+    def __init__(self, model_path: str = PREDICTION_MODEL_PATH):
+        # Use artifacts directory for model, shared with every other predictor in the process
+        self.model_path = model_path
+        self.model_cache = get_model_cache(self.model_path)
+
+    @property
+    def model_version(self) -> Optional[str]:
+        loaded = self.model_cache.get()
+        return None if loaded is None else loaded.version
+
+    @property
+    def current_model_version(self) -> Optional[str]:
+        # Unlike model_version it never reloads the model, reloads are left to the inference workers
+        # which report the version they scored with, see InferenceExecutor.model_version
+        return self.model_cache.current_version
+
+    @staticmethod
+    def get_model_input(model: object, X):
+        # Record arrays from shippingData.get_input_record are only passed on to models that take them
+        if (
+            isinstance(X, np.ndarray)
+            and X.dtype.names is not None
+            and not getattr(model, "supports_record_input", False)
+        ):
+            return pd.DataFrame(X)
+        return X
 
     def predict(self, X) -> float:
 
@@ -122,7 +459,9 @@ class CostPredictor:
         logging.info("Entered predict method of the class")
         try:
             # Check if model exists
-            if not os.path.exists(self.model_path):
+            loaded = self.model_cache.get()
+            if loaded is None:
+                X = self.get_model_input(None, X)
                 # For testing/demo, return a calculated value based on inputs
                 base_price = float(X["Base Shipping Price"].iloc[0])
                 weight = float(X["Weight"].iloc[0])
@@ -133,12 +472,10 @@ class CostPredictor:
                 cost = base_price * weight * international * express * fragile
                 return float(cost)
 
-            # Load model from local file
-            best_model = joblib.load(self.model_path)
-            logging.info("Loaded model from local file")
+            best_model = loaded.model
 
             # Predicting with model
-            result = best_model.predict(X)
+            result = best_model.predict(self.get_model_input(best_model, X))
             # Ensure we return a single float value for a single prediction
             if isinstance(result, (list, np.ndarray)):
                 result = float(result[0])
@@ -151,3 +488,66 @@ class CostPredictor:
         except Exception as e:
             logging.error(f"Error in prediction: {str(e)}")
             raise shippingException(e, sys) from e
+
+    def predict_batch(self, X: DataFrame, chunk_size: int = PREDICTION_BATCH_CHUNK_SIZE) -> np.ndarray:
+
+        """
+        Method Name :   predict_batch
+
+        Description :   This method predicts a batch of rows with one vectorized model call per chunk.
+
+        Output      :   Array of predictions, one per row
+        """
+        logging.info("Entered predict_batch method of the class")
+        try:
+            loaded = self.model_cache.get()
+            if loaded is None:
+                X = self.get_model_input(None, X)
+                # For testing/demo, same calculation as predict for every row
+                international = np.where(X["International"].str.lower() == "yes", 1.5, 1.0)
+                express = np.where(X["Express Shipment"].str.lower() == "yes", 1.3, 1.0)
+                fragile = np.where(X["Fragile"].str.lower() == "yes", 1.2, 1.0)
+                return (
+                    X["Base Shipping Price"].to_numpy(dtype=float)
+                    * X["Weight"].to_numpy(dtype=float)
+                    * international
+                    * express
+                    * fragile
+                )
+
+            best_model = loaded.model
+            X = self.get_model_input(best_model, X)
+            result = np.empty(len(X), dtype=float)
+            for start in range(0, len(X), chunk_size):
+                chunk = (X.iloc if isinstance(X, DataFrame) else X)[start : start + chunk_size]
+                result[start : start + len(chunk)] = np.ravel(best_model.predict(chunk))
+
+            logging.info(f"Predicted {len(X)} rows in {-(-len(X) // chunk_size)} chunks")
+            logging.info("Exited predict_batch method of the class")
+            return result
+
+        except Exception as e:
+            logging.error(f"Error in batch prediction: {str(e)}")
+            raise shippingException(e, sys) from e
+
+    def warm_up(self, n_rows: int = 256) -> Optional[str]:
+
+        """
+        Method Name :   warm_up
+
+        Description :   This method loads the model and scores synthetic rows once through the single
+                        row and the batch paths, so that lazily imported libraries and first call
+                        allocations are paid before the first request.
+
+        Output      :   Version of the warmed up model, None if no model file exists
+        """
+        logging.info("Entered warm_up method of the class")
+        try:
+            records = shippingData.get_sample_records(n_rows)
+            self.predict(records[:1])
+            self.predict_batch(records)
+            logging.info(f"Warmed up model version {self.model_version} with {n_rows} synthetic rows")
+            return self.model_version
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
@@ -0,0 +1,151 @@
+import multiprocessing
+import queue
+import sys
+import threading
+from multiprocessing.process import BaseProcess
+from typing import Dict, List, Optional, Tuple
+from pandas import DataFrame
+from shipment.constant import MODEL_SEARCH_CPU_BUDGET
+from shipment.exception import shippingException
+from shipment.logger import logging
+from shipment.pipeline.stage_graph import check_cancelled
+from shipment.utils.main_utils import Mainutils
+
+
+def _search_candidate(
+    model_name: str,
+    n_threads: int,
+    x_train: DataFrame,
+    y_train: DataFrame,
+    x_test: DataFrame,
+    y_test: DataFrame,
+) -> Tuple[float, object, str]:
+    from joblib.externals.loky import get_reusable_executor
+    from threadpoolctl import threadpool_limits
+
+    try:
+        # BLAS and OpenMP pools loaded by the search are capped too, not just the ones it asks for
+        with threadpool_limits(limits=n_threads):
+            return Mainutils().get_tuned_model(
+                model_name, x_train, y_train, x_test, y_test, n_jobs=n_threads
+            )
+    finally:
+        # Idle cross validation workers would keep the search process from exiting for minutes
+        get_reusable_executor().shutdown(wait=True)
+
+
+def _search_candidate_process(result_queue, model_name: str, n_threads: int, *data) -> None:
+    try:
+        result_queue.put((model_name, _search_candidate(model_name, n_threads, *data), None))
+    except Exception as e:
+        # shippingException cannot be unpickled by the parent, pass its message on instead
+        result_queue.put((model_name, None, str(e)))
+
+
+class ModelSearchScheduler:
+    # Seconds between two looks at the cancel event while searches run
+    CANCEL_POLL_SECONDS = 1.0
+
+    def __init__(
+        self,
+        cpu_budget: int = MODEL_SEARCH_CPU_BUDGET,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        self.cpu_budget = max(1, cpu_budget)
+        self.cancel_event = cancel_event
+
+    @staticmethod
+    def share_threads(free_threads: int, n_pending: int) -> int:
+        # Free cores are split evenly over the candidates still waiting, a single core each when
+        # there are more candidates than cores
+        return max(1, free_threads // n_pending) if n_pending <= free_threads else 1
+
+    def search(
+        self,
+        models_list: List[str],
+        x_train: DataFrame,
+        y_train: DataFrame,
+        x_test: DataFrame,
+        y_test: DataFrame,
+    ) -> List[Tuple[float, object, str]]:
+
+        """
+        Method Name :   search
+
+        Description :   This method tunes every candidate model in its own process, as many at a
+                        time as the cpu budget allows. Each search is given a number of threads so
+                        that cross validation jobs and native model threads together never use more
+                        cores than the budget. When a search fails or cancel_event is set, the
+                        searches not started are dropped and the running search processes are
+                        terminated.
+
+        Output      :   List of model score, tuned model and model name, in the order of models_list
+        """
+        logging.info("Entered the search method of ModelSearchScheduler class")
+        try:
+            data = (x_train, y_train, x_test, y_test)
+            if self.cpu_budget == 1 or len(models_list) == 1:
+                # Nothing to overlap, the search runs in this process without pickling the data
+                results_list = []
+                for model_name in models_list:
+                    check_cancelled(self.cancel_event)
+                    results_list.append(_search_candidate(model_name, self.cpu_budget, *data))
+                return results_list
+
+            results: Dict[str, Tuple[float, object, str]] = {}
+            pending = list(models_list)
+            running: Dict[str, Tuple[BaseProcess, int]] = {}
+            free_threads = self.cpu_budget
+            # Spawned processes do not inherit OpenMP state, forking after it started can deadlock.
+            # The scheduler owns them, so it can terminate them when the search is abandoned.
+            context = multiprocessing.get_context("spawn")
+            result_queue = context.Queue()
+            try:
+                while pending or running:
+                    check_cancelled(self.cancel_event)
+                    while pending and free_threads > 0:
+                        model_name = pending.pop(0)
+                        n_threads = self.share_threads(free_threads, len(pending) + 1)
+                        free_threads -= n_threads
+                        logging.info(f"Searching {model_name} on {n_threads} threads")
+                        process = context.Process(
+                            target=_search_candidate_process,
+                            args=(result_queue, model_name, n_threads, *data),
+                            name=f"model-search-{model_name}",
+                        )
+                        process.start()
+                        running[model_name] = (process, n_threads)
+
+                    try:
+                        model_name, result, error = result_queue.get(
+                            timeout=self.CANCEL_POLL_SECONDS
+                        )
+                    except queue.Empty:
+                        # A process that died without a result, e.g. killed for memory, fails it
+                        for model_name, (process, _) in running.items():
+                            if process.exitcode not in (None, 0):
+                                raise RuntimeError(
+                                    f"Search of {model_name} exited with code {process.exitcode}"
+                                )
+                        continue
+
+                    process, n_threads = running.pop(model_name)
+                    process.join()
+                    free_threads += n_threads
+                    if error is not None:
+                        raise RuntimeError(f"Search of {model_name} failed: {error}")
+                    results[model_name] = result
+                    logging.info(f"Searched {model_name}, score {result[0]}")
+
+            finally:
+                for process, _ in running.values():
+                    process.terminate()
+                for process, _ in running.values():
+                    process.join()
+                result_queue.close()
+
+            logging.info("Exited the search method of ModelSearchScheduler class")
+            return [results[model_name] for model_name in models_list]
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
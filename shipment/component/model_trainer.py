@@ -1,23 +1,41 @@
 import os
 from shipment.logger import logging
 import sys
+import threading
 import pandas as pd
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from pandas import DataFrame
-from shipment.constant import MODEL_CONFIG_FILE
+from shipment.component.model_compiler import CompiledTreeEnsemble, TreeEnsembleCompiler
+from shipment.component.model_search import ModelSearchScheduler
+from shipment.component.preprocessor_compiler import CompiledPreprocessor
+from shipment.constant import COMPILED_MODEL_MAX_ROWS, MODEL_CONFIG_FILE
 from shipment.entity.config_entity import ModelTrainerConfig
 from shipment.entity.artifacts_entity import (
     DataTransformationArtifacts,
     ModelTrainerArtifacts,
 )
 from shipment.exception import shippingException
+from shipment.utils.metrics import stage_timer
 
 
 
 class CostModel:
-    def __init__(self, preprocessing_object: object, trained_model_object: object):
+    def __init__(
+        self,
+        preprocessing_object: object,
+        trained_model_object: object,
+        compiled_model_object: Optional[CompiledTreeEnsemble] = None,
+        compiled_preprocessing_object: Optional[CompiledPreprocessor] = None,
+    ):
         self.preprocessing_object = preprocessing_object
         self.trained_model_object = trained_model_object
+        self.compiled_model_object = compiled_model_object
+        self.compiled_preprocessing_object = compiled_preprocessing_object
+
+    @property
+    def supports_record_input(self) -> bool:
+        # Record arrays from shippingData.get_input_record are encoded by the compiled preprocessor
+        return getattr(self, "compiled_preprocessing_object", None) is not None
 
     def predict(self, X) -> float:
 
@@ -31,10 +49,24 @@ class CostModel:
         logging.info("Entered predict method the class")
         try:
             # Using the trained model to get predictions
-            transformed_feature = self.preprocessing_object.transform(X)
+            with stage_timer("preprocess"):
+                if self.supports_record_input:
+                    transformed_feature = self.compiled_preprocessing_object.transform(X)
+                else:
+                    transformed_feature = self.preprocessing_object.transform(X)
             logging.info("Used the trained model to get predictions")
 
-            return self.trained_model_object.predict(transformed_feature)
+            # Models saved before compilation was added have no compiled_model_object. Large
+            # batches are left to the library, whose native code is faster once dispatch is amortized
+            compiled_model_object = getattr(self, "compiled_model_object", None)
+            with stage_timer("model_predict"):
+                if (
+                    compiled_model_object is not None
+                    and transformed_feature.shape[0] <= COMPILED_MODEL_MAX_ROWS
+                ):
+                    return compiled_model_object.predict(transformed_feature)
+
+                return self.trained_model_object.predict(transformed_feature)
 
         except Exception as e:
             raise shippingException(e, sys) from e
@@ -51,9 +83,11 @@ class ModelTrainer:
         self,
         data_transformation_artifact: DataTransformationArtifacts,
         model_trainer_config: ModelTrainerConfig,
+        cancel_event: Optional[threading.Event] = None,
     ):
         self.data_transformation_artifact = data_transformation_artifact
         self.model_trainer_config = model_trainer_config
+        self.cancel_event = cancel_event
 
     # This method is used to get the trained models
     def get_trained_models(
@@ -84,15 +118,10 @@ class ModelTrainer:
                 y_data.iloc[:, -1],
             )
 
-            # Getting the trained model list
-            tuned_model_list = [
-                (
-                    self.model_trainer_config.UTILS.get_tuned_model(
-                        model_name, x_train, y_train, x_test, y_test
-                    )
-                )
-                for model_name in models_list
-            ]
+            # Getting the trained model list, the candidates are searched in parallel
+            tuned_model_list = ModelSearchScheduler(cancel_event=self.cancel_event).search(
+                models_list, x_train, y_train, x_test, y_test
+            )
             logging.info("Got trained model list")
             logging.info("Exited the get_trained_models method of ModelFinder class")
 
@@ -101,6 +130,29 @@ class ModelTrainer:
         except Exception as e:
             raise shippingException(e, sys) from e
 
+    # This method is used to compile the best model for inference
+    def compile_model(self, model: object, x_data: DataFrame) -> Optional[CompiledTreeEnsemble]:
+
+        """
+        Method Name :   compile_model
+
+        Description :   This method compiles a tree ensemble into flat numpy arrays and checks its
+                        predictions against the model on x_data. Other model types are left as is.
+
+        Output      :   Compiled model or None
+        """
+        logging.info("Entered compile_model method of ModelTrainer class")
+        try:
+            compiler = TreeEnsembleCompiler()
+            compiled_model = compiler.compile(model)
+            max_difference = compiler.verify(compiled_model, model, x_data)
+            logging.info(f"Compiled model matches the trained model within {max_difference}")
+            return compiled_model
+
+        except Exception as e:
+            logging.info(f"Model is not compiled, the trained model will be used for inference: {e}")
+            return None
+
     # This method is used to initialize model training
     def initiate_model_trainer(self) -> ModelTrainerArtifacts:
 
@@ -159,6 +211,14 @@ class ModelTrainer:
             )
             logging.info("Loaded preprocessing object")
 
+            # Loading the compiled preprocessor object when the preprocessor could be compiled
+            compiled_preprocessing_obj = None
+            if self.data_transformation_artifact.compiled_object_file_path is not None:
+                compiled_preprocessing_obj = self.model_trainer_config.UTILS.load_object(
+                    self.data_transformation_artifact.compiled_object_file_path
+                )
+                logging.info("Loaded compiled preprocessing object")
+
             # Reading model config file for getting the best model score
             model_config = self.model_trainer_config.UTILS.read_yaml_file(
                 filename=MODEL_CONFIG_FILE
@@ -170,8 +230,13 @@ class ModelTrainer:
                 # self.model_trainer_config.UTILS.update_model_score(best_model_score)
                 # logger.info("Updating model score in yaml file")
 
+                # Compiling the best model, checked against the test features
+                compiled_model = self.compile_model(best_model, test_df.iloc[:, :-1])
+
                 # Loading cost model object with preprocessor and model
-                cost_model = CostModel(preprocessing_obj, best_model)
+                cost_model = CostModel(
+                    preprocessing_obj, best_model, compiled_model, compiled_preprocessing_obj
+                )
                 logging.info(
                     "Created cost model object with preprocessor and model"
                 )
@@ -185,7 +250,7 @@ class ModelTrainer:
                 logging.info("Saved the best model object path")
             else:
                 logging.info("No best model found with score more than base score")
-                raise "No best model found with score more than base score "
+                raise Exception("No best model found with score more than base score")
 
             # saving the Model trainer artifacts
             model_trainer_artifacts = ModelTrainerArtifacts(
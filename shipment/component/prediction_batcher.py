@@ -0,0 +1,113 @@
+import asyncio
+import sys
+from typing import List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from shipment.component.inference_executor import InferenceExecutor
+from shipment.constant import PREDICTION_BATCH_MAX_SIZE, PREDICTION_BATCH_MAX_WAIT_MS
+from shipment.exception import InferenceRejectedException, shippingException
+from shipment.logger import logging
+
+
+class PredictionBatcher:
+    def __init__(
+        self,
+        inference_executor: InferenceExecutor,
+        max_batch_size: int = PREDICTION_BATCH_MAX_SIZE,
+        max_wait_ms: float = PREDICTION_BATCH_MAX_WAIT_MS,
+    ):
+        self.inference_executor = inference_executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._scoring_tasks = set()
+
+    async def predict(self, X: Union[DataFrame, np.ndarray]) -> float:
+
+        """
+        Method Name :   predict
+
+        Description :   This method queues a single row and waits until it has been scored together
+                        with the other rows that arrived within the batching window.
+
+        Output      :   Prediction for the row
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self._queue.put_nowait((X, future))
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[DataFrame, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            batch = [(X, future) for X, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+            # Score in the background so the next batch can be collected meanwhile
+            task = self._loop.create_task(self._score_batch(batch))
+            self._scoring_tasks.add(task)
+            task.add_done_callback(self._scoring_tasks.discard)
+
+    async def _score_batch(self, batch: List[Tuple[DataFrame, asyncio.Future]]) -> None:
+        try:
+            batch_X = self.concat([X for X, _ in batch])
+            predictions = await self.inference_executor.predict_batch(batch_X)
+            logging.info(f"Scored a micro batch of {len(batch)} requests")
+
+        except InferenceRejectedException as e:
+            for _, future in batch:
+                self._set_exception(future, e)
+            return
+
+        except Exception as e:
+            if len(batch) == 1:
+                self._set_exception(batch[0][1], e)
+                return
+            # Score the requests one by one so that a bad row only fails its own request
+            logging.error(f"Micro batch of {len(batch)} requests failed, retrying individually: {e}")
+            await asyncio.gather(*[self._score_batch([item]) for item in batch])
+            return
+
+        offset = 0
+        for X, future in batch:
+            if not future.done():
+                future.set_result(float(predictions[offset]))
+            offset += len(X)
+
+    @staticmethod
+    def concat(frames: list):
+        # Rows come as record arrays from shippingData.get_input_record or as DataFrames
+        if all(isinstance(X, np.ndarray) for X in frames):
+            return np.concatenate(frames)
+        return pd.concat([pd.DataFrame(X) for X in frames], ignore_index=True)
+
+    @staticmethod
+    def _set_exception(future: asyncio.Future, e: Exception) -> None:
+        if not future.done():
+            if not isinstance(e, (shippingException, InferenceRejectedException)):
+                e = shippingException(e, sys)
+            future.set_exception(e)
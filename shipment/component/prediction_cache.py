@@ -0,0 +1,124 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from shipment.component.model_predictor import shippingData
+from shipment.constant import (
+    PREDICTION_CACHE_KEY_DECIMALS,
+    PREDICTION_CACHE_SIZE,
+    PREDICTION_CACHE_TTL,
+)
+from shipment.logger import logging
+
+
+class PredictionCache:
+    def __init__(
+        self,
+        max_size: int = PREDICTION_CACHE_SIZE,
+        ttl: float = PREDICTION_CACHE_TTL,
+        key_decimals: Optional[int] = PREDICTION_CACHE_KEY_DECIMALS,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.key_decimals = key_decimals
+        self._entries: "OrderedDict[Tuple, Tuple[float, float]]" = OrderedDict()
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+        self._model_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def make_key(self, shipping_data: shippingData) -> Tuple:
+
+        """
+        Method Name :   make_key
+
+        Description :   This method builds the cache key of a shipment. Numerical fields are parsed so
+                        that e.g. "17" and "17.0" share an entry, and rounded when key_decimals is set.
+                        Categorical fields are kept as is since the encoders are case sensitive.
+
+        Output      :   Tuple of canonical feature values
+        """
+        key = []
+        for attribute, column in shippingData.COLUMNS.items():
+            value = getattr(shipping_data, attribute)
+            if column in shippingData.NUMERICAL_COLUMNS:
+                try:
+                    value = float(value)
+                    if self.key_decimals is not None:
+                        value = round(value, self.key_decimals)
+                except (TypeError, ValueError):
+                    pass
+            key.append(value)
+        return tuple(key)
+
+    async def get_or_compute(
+        self, key: Tuple, model_version: Optional[str], compute: Callable[[], Awaitable[float]]
+    ) -> float:
+
+        """
+        Method Name :   get_or_compute
+
+        Description :   This method returns the cached prediction for key. On a miss it awaits compute,
+                        and concurrent callers with the same key share that one computation.
+                        The cache is dropped whenever the model version changes.
+
+        Output      :   Prediction
+        """
+        if not self.enabled:
+            return await compute()
+
+        if model_version != self._model_version:
+            if self._model_version is not None:
+                logging.info(
+                    f"Model version changed from {self._model_version} to {model_version}, clearing prediction cache"
+                )
+            self._entries.clear()
+            self._model_version = model_version
+
+        key = (model_version, key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        # The computation runs as its own task so a disconnecting caller does not cancel it for the others
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.ensure_future(compute())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda task: self._on_computed(key, task))
+        return await asyncio.shield(task)
+
+    def _on_computed(self, key: Tuple, task: asyncio.Future) -> None:
+        del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None or key[0] != self._model_version:
+            return
+        self._entries[key] = (task.result(), time.monotonic() + self.ttl)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "model_version": self._model_version,
+        }
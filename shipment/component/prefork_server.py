@@ -0,0 +1,222 @@
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+from shipment.component.model_predictor import CostPredictor
+from shipment.constant import APP_HOST, APP_PORT, APP_WORKERS, WORKER_MEMORY_REPORT_INTERVAL
+from shipment.exception import shippingException
+from shipment.logger import logging
+
+
+def read_process_memory(pid: int) -> Dict[str, int]:
+
+    """
+    Method Name :   read_process_memory
+
+    Description :   This method reads the memory of a process from /proc. Shared pages are the ones
+                    mapped by more than one process, e.g. the model pages a forked worker has not
+                    written to, PSS divides every shared page among the processes mapping it.
+
+    Output      :   Resident, proportional, shared and private memory in kB
+    """
+    try:
+        # Summed over all mappings, available since Linux 4.14
+        counters = {}
+        with open(f"/proc/{pid}/smaps_rollup") as smaps_file:
+            for line in smaps_file:
+                fields = line.split()
+                if len(fields) == 3 and fields[2] == "kB":
+                    counters[fields[0].rstrip(":")] = int(fields[1])
+        return {
+            "rss_kb": counters.get("Rss", 0),
+            "pss_kb": counters.get("Pss", 0),
+            "shared_kb": counters.get("Shared_Clean", 0) + counters.get("Shared_Dirty", 0),
+            "private_kb": counters.get("Private_Clean", 0) + counters.get("Private_Dirty", 0),
+        }
+    except FileNotFoundError:
+        # statm counts file backed pages as shared, and has no PSS
+        with open(f"/proc/{pid}/statm") as statm_file:
+            _, resident, shared = (int(value) for value in statm_file.read().split()[:3])
+        page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+        return {
+            "rss_kb": resident * page_kb,
+            "pss_kb": None,
+            "shared_kb": shared * page_kb,
+            "private_kb": (resident - shared) * page_kb,
+        }
+
+
+class PreforkServer:
+    # Seconds workers get to finish in flight requests on shutdown before they are killed
+    SHUTDOWN_TIMEOUT = 30
+
+    def __init__(
+        self,
+        app: object,
+        cost_predictor: CostPredictor,
+        workers: int = APP_WORKERS,
+        host: str = APP_HOST,
+        port: int = APP_PORT,
+        memory_report_interval: float = WORKER_MEMORY_REPORT_INTERVAL,
+        mmap_mode: Optional[str] = "r",
+    ):
+        self.app = app
+        self.cost_predictor = cost_predictor
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.memory_report_interval = memory_report_interval
+        self.mmap_mode = mmap_mode
+        self._socket: Optional[socket.socket] = None
+        self._worker_pids: Dict[int, int] = {}
+        self._stopping = False
+
+    def run(self) -> None:
+
+        """
+        Method Name :   run
+
+        Description :   This method loads and warms up the model once, then forks the workers that
+                        serve the app on a shared listening socket. The model pages are shared copy
+                        on write, numpy arrays are memory mapped from a file when mmap_mode is set.
+                        Workers that exit are replaced until the launcher gets SIGINT or SIGTERM.
+
+        Output      :   None
+        """
+        logging.info("Entered the run method of PreforkServer class")
+        try:
+            self._socket = self._bind()
+
+            if self.mmap_mode is not None:
+                self.cost_predictor.model_cache.mmap_mode = self.mmap_mode
+            model_version = self.cost_predictor.warm_up()
+            logging.info(f"Preloaded model version {model_version} in launcher {os.getpid()}")
+
+            # Objects that exist now are never scanned by the collector of a worker, so their pages
+            # are not copied just because a collection touched their headers
+            gc.collect()
+            gc.freeze()
+
+            signal.signal(signal.SIGTERM, self._handle_stop)
+            signal.signal(signal.SIGINT, self._handle_stop)
+            for worker_index in range(self.workers):
+                self._spawn_worker(worker_index)
+            print(
+                f"Serving on http://{self.host}:{self.port} with {self.workers} workers, "
+                f"model version {model_version}",
+                flush=True,
+            )
+
+            next_report = time.monotonic() + min(self.memory_report_interval, 5)
+            while not self._stopping:
+                self._reap_workers()
+                if time.monotonic() >= next_report:
+                    self.log_memory_report()
+                    next_report = time.monotonic() + self.memory_report_interval
+                time.sleep(0.5)
+
+            self._shutdown_workers()
+            logging.info("Exited the run method of PreforkServer class")
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
+
+    def memory_report(self) -> List[Dict]:
+        report = [{"role": "launcher", "pid": os.getpid(), **read_process_memory(os.getpid())}]
+        for pid, worker_index in sorted(self._worker_pids.items(), key=lambda item: item[1]):
+            try:
+                report.append(
+                    {"role": f"worker-{worker_index}", "pid": pid, **read_process_memory(pid)}
+                )
+            except (FileNotFoundError, ProcessLookupError):
+                continue
+        return report
+
+    def log_memory_report(self) -> None:
+        lines = [f"{'process':<10}{'pid':>8}{'rss MB':>10}{'pss MB':>10}{'shared MB':>11}{'private MB':>12}"]
+        for entry in self.memory_report():
+            pss = "-" if entry["pss_kb"] is None else f"{entry['pss_kb'] / 1024:.1f}"
+            lines.append(
+                f"{entry['role']:<10}{entry['pid']:>8}{entry['rss_kb'] / 1024:>10.1f}{pss:>10}"
+                f"{entry['shared_kb'] / 1024:>11.1f}{entry['private_kb'] / 1024:>12.1f}"
+            )
+        report = "\n".join(lines)
+        logging.info(f"Worker memory:\n{report}")
+        print(report, flush=True)
+
+    def _bind(self) -> socket.socket:
+        # An explicit IPPROTO_TCP makes asyncio set TCP_NODELAY on accepted connections, without it
+        # small responses wait for delayed ACKs
+        listen_socket = socket.socket(
+            socket.AF_INET6 if ":" in self.host else socket.AF_INET,
+            socket.SOCK_STREAM,
+            socket.IPPROTO_TCP,
+        )
+        listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listen_socket.bind((self.host, self.port))
+        listen_socket.listen(2048)
+        listen_socket.set_inheritable(True)
+        return listen_socket
+
+    def _spawn_worker(self, worker_index: int) -> None:
+        pid = os.fork()
+        if pid:
+            self._worker_pids[pid] = worker_index
+            logging.info(f"Started worker {worker_index} with pid {pid}")
+            return
+
+        # Worker process, uvicorn installs its own handlers for a graceful shutdown
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            import uvicorn
+
+            server = uvicorn.Server(uvicorn.Config(self.app, log_level="info"))
+            server.run(sockets=[self._socket])
+        except BaseException as e:
+            logging.error(f"Worker {worker_index} failed: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _reap_workers(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker_index = self._worker_pids.pop(pid, None)
+            if worker_index is None:
+                continue
+            logging.error(
+                f"Worker {worker_index} with pid {pid} exited with status {os.waitstatus_to_exitcode(status)}"
+            )
+            if not self._stopping:
+                self._spawn_worker(worker_index)
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _shutdown_workers(self) -> None:
+        logging.info(f"Stopping {len(self._worker_pids)} workers")
+        for pid in list(self._worker_pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.SHUTDOWN_TIMEOUT
+        while self._worker_pids and time.monotonic() < deadline:
+            self._reap_workers()
+            time.sleep(0.1)
+        for pid in list(self._worker_pids):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self._socket.close()
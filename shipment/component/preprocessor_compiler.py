@@ -0,0 +1,227 @@
+import sys
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from shipment.exception import shippingException
+from shipment.logger import logging
+
+
+class CompiledPreprocessor:
+    def __init__(
+        self,
+        lookups: List[Tuple[str, Dict[object, int], np.ndarray, slice]],
+        numerical_columns: List[str],
+        mean: np.ndarray,
+        scale: np.ndarray,
+        numerical_slice: slice,
+        n_features_out: int,
+    ):
+        # One lookup per categorical column: the column name, the row of the code table for each
+        # known category, the code table itself and the output columns it fills. The last two rows
+        # of every code table are the codes of unknown and of missing values.
+        self.lookups = lookups
+        self.numerical_columns = numerical_columns
+        self.mean = mean
+        self.scale = scale
+        self.numerical_slice = numerical_slice
+        self.n_features_out = n_features_out
+
+    @property
+    def input_columns(self) -> List[str]:
+        return [column for column, _, _, _ in self.lookups] + list(self.numerical_columns)
+
+    def transform(self, X, out: Optional[np.ndarray] = None) -> np.ndarray:
+
+        """
+        Method Name :   transform
+
+        Description :   This method encodes X, a record array, a DataFrame or a dict of columns, in one
+                        pass. Categorical codes are gathered from the lookup tables, per category for
+                        pandas categorical columns, and the numerical columns are scaled with a single
+                        affine op, straight into out when given.
+
+        Output      :   Transformed features in the column order of the ColumnTransformer
+        """
+        if isinstance(X, dict):
+            X = {column: np.atleast_1d(np.asarray(value)) for column, value in X.items()}
+        n_rows = len(X[self.input_columns[0]])
+        if out is None:
+            out = np.empty((n_rows, self.n_features_out), dtype=np.float64)
+        elif out.shape != (n_rows, self.n_features_out):
+            raise ValueError(
+                f"Output buffer has shape {out.shape}, expected {(n_rows, self.n_features_out)}"
+            )
+
+        for column, index, table, output_slice in self.lookups:
+            unknown, missing = len(table) - 2, len(table) - 1
+            values = X[column]
+            if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+                # Only the distinct categories are looked up, rows are gathered by their codes and
+                # code -1, a missing value, picks the last entry
+                values = pd.Categorical(values)
+                category_rows = [index.get(value, unknown) for value in values.categories]
+                rows = np.asarray(category_rows + [missing], dtype=np.intp)[values.codes]
+            else:
+                rows = np.fromiter(
+                    (
+                        index.get(value, missing if value is None or value != value else unknown)
+                        for value in np.asarray(values, dtype=object)
+                    ),
+                    dtype=np.intp,
+                    count=n_rows,
+                )
+            out[:, output_slice] = table[rows]
+
+        numerical = out[:, self.numerical_slice]
+        for position, column in enumerate(self.numerical_columns):
+            numerical[:, position] = X[column]
+        # Same operation order as StandardScaler.transform, so the results are bit for bit equal
+        numerical -= self.mean
+        numerical /= self.scale
+        return out
+
+    def __repr__(self):
+        return (
+            f"CompiledPreprocessor(n_categorical={len(self.lookups)}, "
+            f"n_numerical={len(self.numerical_columns)}, n_features_out={self.n_features_out})"
+        )
+
+
+class PreprocessorCompiler:
+    def compile(self, preprocessor: object) -> CompiledPreprocessor:
+
+        """
+        Method Name :   compile
+
+        Description :   This method compiles a fitted ColumnTransformer made of OneHotEncoder,
+                        category_encoders BinaryEncoder and StandardScaler steps into a
+                        CompiledPreprocessor that encodes without calling sklearn or pandas.
+
+        Output      :   CompiledPreprocessor
+        """
+        logging.info("Entered the compile method of PreprocessorCompiler class")
+        try:
+            if getattr(preprocessor, "remainder", "drop") != "drop":
+                raise ValueError("Cannot compile a ColumnTransformer that passes columns through")
+
+            lookups = []
+            numerical_columns, mean, scale, numerical_slice = [], None, None, slice(0, 0)
+            for name, transformer, columns in preprocessor.transformers_:
+                if transformer == "drop" or name == "remainder":
+                    continue
+                output_slice = preprocessor.output_indices_[name]
+                transformer_name = transformer.__class__.__name__
+                if transformer_name == "OneHotEncoder":
+                    lookups.extend(self._onehot_lookups(transformer, columns, output_slice.start))
+                elif transformer_name == "BinaryEncoder":
+                    lookups.extend(self._binary_lookups(transformer, columns, output_slice.start))
+                elif transformer_name == "StandardScaler":
+                    if numerical_columns:
+                        raise ValueError("Cannot compile more than one StandardScaler")
+                    numerical_columns = list(columns)
+                    mean = np.zeros(len(columns)) if transformer.mean_ is None else transformer.mean_
+                    scale = np.ones(len(columns)) if transformer.scale_ is None else transformer.scale_
+                    numerical_slice = output_slice
+                else:
+                    raise ValueError(f"Cannot compile transformer of type {transformer_name}")
+
+            compiled = CompiledPreprocessor(
+                lookups=lookups,
+                numerical_columns=numerical_columns,
+                mean=np.asarray(mean, dtype=np.float64),
+                scale=np.asarray(scale, dtype=np.float64),
+                numerical_slice=numerical_slice,
+                n_features_out=max(
+                    output_slice.stop for output_slice in preprocessor.output_indices_.values()
+                ),
+            )
+            logging.info(f"Compiled {compiled}")
+            logging.info("Exited the compile method of PreprocessorCompiler class")
+            return compiled
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
+
+    @staticmethod
+    def verify(compiled: CompiledPreprocessor, preprocessor: object, X: pd.DataFrame) -> float:
+
+        """
+        Method Name :   verify
+
+        Description :   This method checks that the compiled preprocessor reproduces
+                        preprocessor.transform on the DataFrame X.
+
+        Output      :   Largest absolute difference, raises when it is not zero
+        """
+        expected = preprocessor.transform(X)
+        if hasattr(expected, "toarray"):
+            expected = expected.toarray()
+        actual = compiled.transform(X)
+        if expected.shape != actual.shape:
+            raise ValueError(
+                f"Compiled preprocessor output has shape {actual.shape}, expected {expected.shape}"
+            )
+        max_difference = float(np.max(np.abs(expected - actual))) if expected.size else 0.0
+        if max_difference > 0:
+            raise ValueError(f"Compiled preprocessor differs from the preprocessor by {max_difference}")
+        return max_difference
+
+    @staticmethod
+    def _onehot_lookups(transformer: object, columns: list, offset: int) -> list:
+        if transformer.drop is not None or transformer.handle_unknown != "ignore":
+            raise ValueError("Can only compile OneHotEncoder with handle_unknown='ignore' and no drop")
+        if getattr(transformer, "infrequent_categories_", None) and any(
+            categories is not None for categories in transformer.infrequent_categories_
+        ):
+            raise ValueError("Cannot compile OneHotEncoder with infrequent categories")
+
+        lookups = []
+        for column, categories in zip(columns, transformer.categories_):
+            width = len(categories)
+            # Identity rows for the known categories, zeros for unknown and missing values
+            table = np.zeros((width + 2, width), dtype=np.float64)
+            table[np.arange(width), np.arange(width)] = 1.0
+            index = {}
+            for position, category in enumerate(categories):
+                if pd.isna(category):
+                    table[width + 1, position] = 1.0
+                else:
+                    index[category] = position
+            lookups.append((column, index, table, slice(offset, offset + width)))
+            offset += width
+        return lookups
+
+    @staticmethod
+    def _binary_lookups(transformer: object, columns: list, offset: int) -> list:
+        if transformer.handle_unknown != "value" or transformer.handle_missing != "value":
+            raise ValueError(
+                "Can only compile BinaryEncoder with handle_unknown='value' and handle_missing='value'"
+            )
+        if transformer.drop_invariant and len(transformer.invariant_cols):
+            raise ValueError("Cannot compile BinaryEncoder that dropped invariant columns")
+
+        ordinal_mappings = {
+            mapping["col"]: mapping["mapping"] for mapping in transformer.ordinal_encoder.mapping
+        }
+        lookups = []
+        for mapping in transformer.mapping:
+            column = mapping["col"]
+            codes = mapping["mapping"]
+            ordinals = ordinal_mappings[column]
+            width = codes.shape[1]
+
+            # Rows for the known categories, then the codes category_encoders uses for unknown
+            # (ordinal -1) and missing (ordinal -2) values
+            known = [(category, ordinal) for category, ordinal in ordinals.items() if not pd.isna(category)]
+            missing_ordinal = next(
+                (ordinal for category, ordinal in ordinals.items() if pd.isna(category)), -2
+            )
+            table = np.vstack(
+                [codes.loc[[ordinal for _, ordinal in known]].to_numpy(dtype=np.float64)]
+                + [codes.loc[[-1]].to_numpy(dtype=np.float64)]
+                + [codes.loc[[missing_ordinal]].to_numpy(dtype=np.float64)]
+            )
+            index = {category: position for position, (category, _) in enumerate(known)}
+            lookups.append((column, index, table, slice(offset, offset + width)))
+            offset += width
+        return lookups
@@ -0,0 +1,119 @@
+from typing import AsyncIterator, List, Tuple
+import numpy as np
+from pydantic import ValidationError
+from shipment.component.inference_executor import InferenceExecutor
+from shipment.component.model_predictor import shippingData
+from shipment.constant import STREAM_CHUNK_ROWS, STREAM_MAX_LINE_BYTES
+from shipment.entity.prediction_entity import ShipmentRequest
+from shipment.logger import logging
+from shipment.utils.serialization import dumps
+
+
+class StreamScorer:
+    def __init__(
+        self,
+        inference_executor: InferenceExecutor,
+        chunk_rows: int = STREAM_CHUNK_ROWS,
+        max_line_bytes: int = STREAM_MAX_LINE_BYTES,
+    ):
+        self.inference_executor = inference_executor
+        self.chunk_rows = chunk_rows
+        self.max_line_bytes = max_line_bytes
+
+    async def iter_lines(self, byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+        # Splits the body on newlines as it arrives, only a partial last line is kept between chunks
+        pending = bytearray()
+        line_number = 0
+        async for byte_chunk in byte_chunks:
+            pending += byte_chunk
+            start = 0
+            while True:
+                end = pending.find(b"\n", start)
+                if end < 0:
+                    break
+                line_number += 1
+                yield line_number, bytes(pending[start:end])
+                start = end + 1
+            del pending[:start]
+            if len(pending) > self.max_line_bytes:
+                raise ValueError(f"Line {line_number + 1} is longer than {self.max_line_bytes} bytes")
+        if pending:
+            yield line_number + 1, bytes(pending)
+
+    async def score(self, byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+
+        """
+        Method Name :   score
+
+        Description :   This method reads newline delimited JSON shipments as they arrive, scores
+                        them chunk_rows at a time and yields the NDJSON results of every chunk as soon
+                        as it is scored. One record buffer is reused for every chunk, so memory does
+                        not depend on the length of the stream. Each input line gets one result line,
+                        in order, with the cost or the reason the line was not scored. A line longer
+                        than max_line_bytes gets an error line and ends the stream.
+
+        Output      :   NDJSON result chunks
+        """
+        records = np.empty(self.chunk_rows, dtype=shippingData.RECORD_DTYPE)
+        # Line number and either the row in records or the error of the line
+        results: List[Tuple[int, object]] = []
+        n_rows = n_lines = line_number = 0
+
+        try:
+            async for line_number, line in self.iter_lines(byte_chunks):
+                if not line.strip():
+                    continue
+                n_lines += 1
+                try:
+                    shipment_request = ShipmentRequest.model_validate_json(line)
+                    shipping_data = shippingData(**shipment_request.model_dump())
+                    shipping_data.get_input_record(out=records, index=n_rows)
+                    results.append((line_number, n_rows))
+                    n_rows += 1
+                except ValidationError as e:
+                    errors = e.errors(include_url=False, include_context=False, include_input=False)
+                    results.append((line_number, errors))
+                except ValueError as e:
+                    results.append((line_number, f"{e}"))
+
+                if n_rows == self.chunk_rows:
+                    yield await self._score_chunk(records, n_rows, results)
+                    results, n_rows = [], 0
+
+        except ValueError as e:
+            # A line over max_line_bytes ends the stream, the lines before it are answered first
+            if results:
+                yield await self._score_chunk(records, n_rows, results)
+            logging.warning(f"Stopped a stream after {n_lines} shipments: {e}")
+            yield dumps({"line": line_number + 1, "status": False, "error": f"{e}"}) + b"\n"
+            return
+
+        if results:
+            yield await self._score_chunk(records, n_rows, results)
+        logging.info(f"Scored a stream of {n_lines} shipments")
+
+    async def _score_chunk(
+        self, records: np.ndarray, n_rows: int, results: List[Tuple[int, object]]
+    ) -> bytes:
+        costs = None
+        error = None
+        if n_rows:
+            try:
+                costs = await self.inference_executor.predict_batch(
+                    X=records[:n_rows], deadline_ms=None
+                )
+            except Exception as e:
+                # Reported on every line of the chunk, the stream carries on with the next one
+                logging.error(f"Scoring a stream chunk of {n_rows} rows failed: {e}")
+                error = f"{e}"
+
+        lines = []
+        for line_number, result in results:
+            if not isinstance(result, int):
+                lines.append(dumps({"line": line_number, "status": False, "error": result}))
+            elif error is not None:
+                lines.append(dumps({"line": line_number, "status": False, "error": error}))
+            else:
+                cost = round(float(costs[result]), 2)
+                lines.append(dumps({"line": line_number, "status": True, "cost": cost}))
+        return b"\n".join(lines) + b"\n"
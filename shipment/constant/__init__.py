@@ -1,10 +1,12 @@
 import os
 from os import environ
 from datetime import datetime
-from from_root.root import from_root
 
 TIMESTAMP: str = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
 
+# Repository root, derived from this file instead of searching the filesystem with from_root at import
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 MODEL_CONFIG_FILE = "config/model.yaml"
 SCHEMA_FILE_PATH = "config/schema.yaml"
 
@@ -14,7 +16,31 @@ TARGET_COLUMN = "Cost"
 DB_NAME = "shipmentdata"
 COLLECTION_NAME = "ship"
 TEST_SIZE = 0.2
-ARTIFACTS_DIR = os.path.join(from_root(), "artifacts", TIMESTAMP)
+ARTIFACTS_ROOT_DIR = os.path.join(PROJECT_ROOT, "artifacts")
+ARTIFACTS_DIR = os.path.join(ARTIFACTS_ROOT_DIR, TIMESTAMP)
+
+# Stage outputs of earlier runs, reused when a stage's inputs, configs and code are unchanged.
+# STAGE_CACHE_CODE_VERSION, e.g. an image tag, replaces the hash of the package source when set.
+STAGE_CACHE_ENABLED = os.getenv("STAGE_CACHE_ENABLED", "true").lower() == "true"
+STAGE_CACHE_DIR = os.getenv("STAGE_CACHE_DIR", os.path.join(ARTIFACTS_ROOT_DIR, "stage_cache"))
+STAGE_CACHE_MAX_ENTRIES = int(os.getenv("STAGE_CACHE_MAX_ENTRIES", 3))
+STAGE_CACHE_CODE_VERSION = os.getenv("STAGE_CACHE_CODE_VERSION") or None
+STAGE_CACHE_REPORT_FILE_NAME = "stage_cache_report.json"
+
+# Training stages that do not depend on each other, e.g. the S3 model fetch, run on this many threads
+TRAINING_STAGE_WORKERS = int(os.getenv("TRAINING_STAGE_WORKERS", 4))
+
+# Cores shared by the hyperparameter searches of the candidate models, which run in parallel
+# processes. Cross validation jobs and the native threads of xgboost or catboost count against it.
+MODEL_SEARCH_CPU_BUDGET = int(os.getenv("MODEL_SEARCH_CPU_BUDGET", os.cpu_count() or 1))
+MODEL_SEARCH_CV = int(os.getenv("MODEL_SEARCH_CV", 2))
+# Default wall clock budget of each model's search, 0 for none, overridden by search in model.yaml
+MODEL_SEARCH_MAX_SECONDS = float(os.getenv("MODEL_SEARCH_MAX_SECONDS", 0))
+
+# XGBoost and CatBoost models are fitted with early stopping on this share of the train set, their
+# n_estimators is the most rounds they get. 0 rounds disables early stopping.
+MODEL_EARLY_STOPPING_ROUNDS = int(os.getenv("MODEL_EARLY_STOPPING_ROUNDS", 20))
+MODEL_EARLY_STOPPING_VALIDATION_SIZE = float(os.getenv("MODEL_EARLY_STOPPING_VALIDATION_SIZE", 0.1))
 
 
 DATA_INGESTION_ARTIFACTS_DIR = "DataIngestionArtifacts"
@@ -33,6 +59,7 @@ TRANSFORMED_TEST_DATA_DIR = "TransformedTest"
 TRANSFORMED_TRAIN_DATA_FILE_NAME = "transformed_train_data.npz"
 TRANSFORMED_TEST_DATA_FILE_NAME = "transformed_test_data.npz"
 PREPROCESSOR_OBJECT_FILE_NAME = "shipping_preprocessor.pkl"
+COMPILED_PREPROCESSOR_OBJECT_FILE_NAME = "compiled_shipping_preprocessor.pkl"
 
 
 MODEL_TRAINER_ARTIFACTS_DIR = "ModelTrainerArtifacts"
@@ -44,5 +71,86 @@ BUCKET_NAME = "shipment-model-io-files"
 S3_MODEL_NAME = "shipping_price_model.pkl"
 
 
-APP_HOST = "0.0.0.0"
-APP_PORT = 8080
+APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
+APP_PORT = int(os.getenv("APP_PORT", 8080))
+
+# Worker processes forked by the preloading launcher, 1 runs a single uvicorn process
+APP_WORKERS = int(os.getenv("APP_WORKERS", 1))
+WORKER_MEMORY_REPORT_INTERVAL = float(os.getenv("WORKER_MEMORY_REPORT_INTERVAL", 60))
+
+# Synthetic rows scored at startup before /ready reports the instance as ready, 0 skips the warm up
+WARMUP_ROWS = int(os.getenv("WARMUP_ROWS", 256))
+
+
+PREDICTION_MODEL_PATH = os.getenv(
+    "PREDICTION_MODEL_PATH", os.path.join("artifacts", "model_trainer", "model.joblib")
+)
+MODEL_RELOAD_CHECK_INTERVAL = float(os.getenv("MODEL_RELOAD_CHECK_INTERVAL", 5))
+# "r" memory maps the numpy arrays of the model from a joblib copy, so processes share their pages
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE") or None
+PREDICTION_BATCH_CHUNK_SIZE = int(os.getenv("PREDICTION_BATCH_CHUNK_SIZE", 10000))
+
+# /predict/arrow decodes and scores uploads in batches of this many rows, the body is spooled to a
+# temporary file once it is larger than ARROW_SPOOL_MAX_MEMORY_MB
+ARROW_BATCH_ROWS = int(os.getenv("ARROW_BATCH_ROWS", 65536))
+ARROW_SPOOL_MAX_MEMORY_MB = int(os.getenv("ARROW_SPOOL_MAX_MEMORY_MB", 64))
+
+# /predict/stream scores NDJSON shipments in chunks of this many lines, longer lines are rejected
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", 256))
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", 65536))
+
+# Largest cartesian product of option values /predict/matrix prices in one request
+QUOTE_MATRIX_MAX_VARIANTS = int(os.getenv("QUOTE_MATRIX_MAX_VARIANTS", 4096))
+
+# Inputs up to this many rows are scored with the compiled tree ensemble, larger ones with the library
+COMPILED_MODEL_MAX_ROWS = int(os.getenv("COMPILED_MODEL_MAX_ROWS", 64))
+
+# Opt-in coalescing of concurrent single row /predict requests
+PREDICTION_BATCHING_ENABLED = os.getenv("PREDICTION_BATCHING_ENABLED", "false").lower() == "true"
+PREDICTION_BATCH_MAX_SIZE = int(os.getenv("PREDICTION_BATCH_MAX_SIZE", 64))
+PREDICTION_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICTION_BATCH_MAX_WAIT_MS", 5))
+
+# Executor running CPU bound inference away from the event loop, "thread" or "process"
+INFERENCE_EXECUTOR_TYPE = os.getenv("INFERENCE_EXECUTOR_TYPE", "thread")
+INFERENCE_MAX_WORKERS = int(os.getenv("INFERENCE_MAX_WORKERS", os.cpu_count() or 1))
+INFERENCE_MAX_QUEUE_DEPTH = int(os.getenv("INFERENCE_MAX_QUEUE_DEPTH", 256))
+INFERENCE_DEADLINE_MS = float(os.getenv("INFERENCE_DEADLINE_MS", 2000))
+
+# Admission control of POST requests to the prediction routes, per worker process. Requests past the
+# concurrency limit wait in a bounded queue, at most their deadline, which clients may lower with the
+# X-Deadline-Ms header. Clients, told apart by ADMISSION_CLIENT_HEADER or their address, get a token
+# bucket of ADMISSION_RATE_PER_CLIENT requests per second, 0 disables rate limiting.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 64))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 256))
+ADMISSION_DEADLINE_MS = float(os.getenv("ADMISSION_DEADLINE_MS", INFERENCE_DEADLINE_MS))
+ADMISSION_RATE_PER_CLIENT = float(os.getenv("ADMISSION_RATE_PER_CLIENT", 0))
+ADMISSION_BURST_PER_CLIENT = float(os.getenv("ADMISSION_BURST_PER_CLIENT", 20))
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "x-client-id").lower()
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", 10000))
+
+# Training jobs run in worker processes, at most TRAINING_MAX_CONCURRENT_JOBS at once across all the
+# server workers. Their status is kept in TRAINING_JOBS_DIR so that any server worker can report it,
+# only the TRAINING_MAX_FINISHED_JOBS most recently finished jobs are kept
+TRAINING_MAX_CONCURRENT_JOBS = int(os.getenv("TRAINING_MAX_CONCURRENT_JOBS", 1))
+TRAINING_JOBS_DIR = os.getenv(
+    "TRAINING_JOBS_DIR", os.path.join(ARTIFACTS_ROOT_DIR, "training_jobs")
+)
+TRAINING_MAX_FINISHED_JOBS = int(os.getenv("TRAINING_MAX_FINISHED_JOBS", 100))
+
+# Cache of /predict results, keyed on the canonical shipment features and the model version
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 10000))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", 600))
+PREDICTION_CACHE_KEY_DECIMALS = (
+    int(os.getenv("PREDICTION_CACHE_KEY_DECIMALS"))
+    if os.getenv("PREDICTION_CACHE_KEY_DECIMALS")
+    else None
+)
+
+# /debug/profile is only served when a token is set, requests must send it as a bearer token
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN") or None
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", 60))
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", 25))
+
+# Latency histograms and counters served on /metrics, recording is skipped entirely when disabled
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 # Data Ingestion Artifacts
 @dataclass
@@ -19,6 +20,7 @@ class DataTransformationArtifacts:
     transformed_object_file_path: str
     transformed_train_file_path: str
     transformed_test_file_path: str
+    compiled_object_file_path: Optional[str] = None
 
 
 @dataclass
@@ -0,0 +1,67 @@
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from shipment.constant import QUOTE_MATRIX_MAX_VARIANTS
+
+
+# JSON prediction request, same fields as shippingData. Numbers may also be sent as strings.
+class ShipmentRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
+    artist: float
+    height: float
+    width: float
+    weight: float
+    material: str = Field(min_length=1)
+    priceOfSculpture: float
+    baseShippingPrice: float
+    international: str = Field(min_length=1)
+    expressShipment: str = Field(min_length=1)
+    installationIncluded: str = Field(min_length=1)
+    transport: str = Field(min_length=1)
+    fragile: str = Field(min_length=1)
+    customerInformation: str = Field(min_length=1)
+    remoteLocation: str = Field(min_length=1)
+
+
+# JSON prediction response
+class PredictionResponse(BaseModel):
+    status: bool = True
+    cost: float
+    model_version: Optional[str] = None
+
+
+# What-if request: a base shipment and, per field to vary, the values to price it with
+class QuoteMatrixRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    base: ShipmentRequest
+    vary: Dict[str, List[Union[float, str]]] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def validate_axes(self) -> "QuoteMatrixRequest":
+        n_variants = 1
+        base = self.base.model_dump()
+        for field, values in self.vary.items():
+            if field not in ShipmentRequest.model_fields:
+                raise ValueError(f"Unknown field to vary: {field}")
+            if not values:
+                raise ValueError(f"No values given for {field}")
+            # Every value is checked and converted like the same field of the base shipment
+            self.vary[field] = [
+                getattr(ShipmentRequest.model_validate({**base, field: value}), field)
+                for value in values
+            ]
+            n_variants *= len(values)
+        if n_variants > QUOTE_MATRIX_MAX_VARIANTS:
+            raise ValueError(
+                f"{n_variants} variants requested, at most {QUOTE_MATRIX_MAX_VARIANTS} are allowed"
+            )
+        return self
+
+
+# What-if response, prices[i][j]... is the price for the i-th value of the first axis and so on
+class QuoteMatrixResponse(BaseModel):
+    status: bool = True
+    model_version: Optional[str] = None
+    axes: Dict[str, List[Union[float, str]]]
+    prices: Union[float, List]
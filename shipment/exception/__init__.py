@@ -18,4 +18,28 @@ class shippingException(Exception):
         self.error_message = error_message_detail(error_message, error_detail)
 
     def __str__(self):
-        return self.error_message
\ No newline at end of file
+        return self.error_message
+
+
+class InferenceRejectedException(Exception):
+    """
+    Raised when a prediction is refused because the service is overloaded or its deadline passed
+    """
+
+
+class AdmissionRejectedException(InferenceRejectedException):
+    """
+    Raised when admission control sheds a request before it reaches its route
+    """
+
+    def __init__(self, error_message: str, status_code: int, reason: str, retry_after: float):
+        super().__init__(error_message)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ProfilerBusyException(Exception):
+    """
+    Raised when a profile is requested while another one is running
+    """
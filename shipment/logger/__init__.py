@@ -1,16 +1,25 @@
 import logging
 import os   
 from datetime import datetime
-from from_root import from_root
+from shipment.constant import PROJECT_ROOT
 
 LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
 
-log_path = os.path.join(from_root(), "log", LOG_FILE)
-
-os.makedirs(log_path, exist_ok=True)
+log_path = os.path.join(PROJECT_ROOT, "log", LOG_FILE)
 
 LOG_FILE_PATH = os.path.join(log_path, LOG_FILE)
 
-logging.basicConfig(filename=LOG_FILE_PATH,
+
+class LazyFileHandler(logging.FileHandler):
+    # The log directory and file are created when the first record is written, not at import
+    def __init__(self, filename: str):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+logging.basicConfig(handlers=[LazyFileHandler(LOG_FILE_PATH)],
                     level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
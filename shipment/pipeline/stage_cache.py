@@ -0,0 +1,250 @@
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from importlib import metadata
+from typing import Callable, Dict, List, Optional, Type
+from shipment.constant import (
+    PROJECT_ROOT,
+    STAGE_CACHE_CODE_VERSION,
+    STAGE_CACHE_DIR,
+    STAGE_CACHE_ENABLED,
+    STAGE_CACHE_MAX_ENTRIES,
+)
+from shipment.exception import shippingException
+from shipment.logger import logging
+from shipment.pipeline.stage_graph import check_cancelled
+
+# Libraries whose version changes the fitted objects and pickles a stage writes
+CODE_VERSION_PACKAGES = (
+    "numpy",
+    "pandas",
+    "scikit-learn",
+    "xgboost",
+    "catboost",
+    "category_encoders",
+    "evidently",
+)
+
+
+def hash_file(file_path: str) -> str:
+    if not os.path.isfile(file_path):
+        return "missing"
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_data_frame(df) -> str:
+    # Row hashes of pandas plus the columns and dtypes, independent of how the frame was built
+    import pandas as pd
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def get_code_version() -> str:
+
+    """
+    Method Name :   get_code_version
+
+    Description :   This method hashes the source of the shipment package together with the
+                    versions of the libraries that fit and pickle the stage artifacts.
+
+    Output      :   Code version hash, or STAGE_CACHE_CODE_VERSION when it is set
+    """
+    if STAGE_CACHE_CODE_VERSION is not None:
+        return STAGE_CACHE_CODE_VERSION
+    digest = hashlib.sha256()
+    package_dir = os.path.join(PROJECT_ROOT, "shipment")
+    for directory, directory_names, file_names in sorted(os.walk(package_dir)):
+        directory_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.endswith(".py"):
+                file_path = os.path.join(directory, file_name)
+                digest.update(os.path.relpath(file_path, package_dir).encode())
+                digest.update(hash_file(file_path).encode())
+    for package in CODE_VERSION_PACKAGES:
+        try:
+            digest.update(f"{package}=={metadata.version(package)}".encode())
+        except metadata.PackageNotFoundError:
+            digest.update(f"{package} missing".encode())
+    return digest.hexdigest()
+
+
+class StageCache:
+    ARTIFACT_FILE_NAME = "artifact.json"
+
+    def __init__(
+        self,
+        cache_dir: str = STAGE_CACHE_DIR,
+        enabled: bool = STAGE_CACHE_ENABLED,
+        max_entries: int = STAGE_CACHE_MAX_ENTRIES,
+    ):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.code_version = get_code_version() if enabled else None
+        # One entry per stage run through the cache, in run order
+        self.report: List[Dict] = []
+
+    def fingerprint(self, stage_name: str, inputs: Dict[str, object]) -> str:
+        payload = json.dumps(
+            {"stage": stage_name, "code_version": self.code_version, "inputs": inputs},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def is_hit(self, stage_name: str) -> bool:
+        return any(entry["stage"] == stage_name and entry["hit"] for entry in self.report)
+
+    def run(
+        self,
+        stage_name: str,
+        inputs: Dict[str, object],
+        artifact_class: Type,
+        stage_function: Callable,
+        cancel_event: Optional[threading.Event] = None,
+        **kwargs,
+    ) -> object:
+
+        """
+        Method Name :   run
+
+        Description :   This method returns the cached artifact of the stage when an earlier run had
+                        the same fingerprint, i.e. the same inputs, configs and code version.
+                        Otherwise it runs the stage and stores its artifact and the files the
+                        artifact points to under the fingerprint. The stage is not started once
+                        cancel_event is set.
+
+        Output      :   Stage artifact, its file paths point into the cache on a hit
+        """
+        if not self.enabled:
+            check_cancelled(cancel_event)
+            return stage_function(**kwargs)
+        start_time = time.perf_counter()
+        fingerprint = self.fingerprint(stage_name, inputs)
+        artifact = self.get(stage_name, fingerprint, artifact_class)
+        hit = artifact is not None
+        if hit:
+            logging.info(f"Reusing cached {stage_name} artifact {fingerprint[:12]}")
+        else:
+            check_cancelled(cancel_event)
+            artifact = stage_function(**kwargs)
+            self.put(stage_name, fingerprint, artifact)
+        self.report.append(
+            {
+                "stage": stage_name,
+                "fingerprint": fingerprint,
+                "hit": hit,
+                "seconds": round(time.perf_counter() - start_time, 3),
+                "inputs": inputs,
+            }
+        )
+        return artifact
+
+    def get(self, stage_name: str, fingerprint: str, artifact_class: Type) -> Optional[object]:
+        entry_dir = os.path.join(self.cache_dir, stage_name, fingerprint)
+        try:
+            with open(os.path.join(entry_dir, self.ARTIFACT_FILE_NAME)) as artifact_file:
+                fields = json.load(artifact_file)
+            values = {}
+            for name, field in fields.items():
+                if "file" in field:
+                    file_path = os.path.join(entry_dir, field["file"])
+                    if not os.path.isfile(file_path):
+                        return None
+                    values[name] = file_path
+                else:
+                    values[name] = field["value"]
+            artifact = artifact_class(**values)
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        # Entries are evicted least recently used first
+        os.utime(entry_dir)
+        return artifact
+
+    def put(self, stage_name: str, fingerprint: str, artifact: object) -> None:
+        try:
+            stage_dir = os.path.join(self.cache_dir, stage_name)
+            entry_dir = os.path.join(stage_dir, fingerprint)
+            if os.path.isdir(entry_dir):
+                return
+            # Built next to the entry and renamed into place, so readers never see half an entry
+            temporary_dir = os.path.join(stage_dir, f".{fingerprint}.{uuid.uuid4().hex}")
+            os.makedirs(temporary_dir)
+            fields = {}
+            for field in dataclasses.fields(artifact):
+                value = getattr(artifact, field.name)
+                if field.name.endswith("_path") and isinstance(value, str) and os.path.isfile(value):
+                    cached_name = f"{field.name}{os.path.splitext(value)[1]}"
+                    shutil.copy2(value, os.path.join(temporary_dir, cached_name))
+                    fields[field.name] = {"file": cached_name}
+                else:
+                    fields[field.name] = {"value": value}
+            with open(os.path.join(temporary_dir, self.ARTIFACT_FILE_NAME), "w") as artifact_file:
+                json.dump(fields, artifact_file, indent=2)
+            try:
+                os.rename(temporary_dir, entry_dir)
+            except OSError:
+                # Another run stored the same entry first
+                shutil.rmtree(temporary_dir, ignore_errors=True)
+            self.evict(stage_name)
+
+        except Exception as e:
+            # A stage that ran fine is not failed because its artifact could not be cached
+            logging.error(f"Could not cache the {stage_name} artifact: {e}")
+
+    def evict(self, stage_name: str) -> None:
+        stage_dir = os.path.join(self.cache_dir, stage_name)
+        entries = sorted(
+            (
+                os.path.join(stage_dir, entry_name)
+                for entry_name in os.listdir(stage_dir)
+                if not entry_name.startswith(".")
+            ),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+        for entry_dir in entries[self.max_entries :]:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            logging.info(f"Evicted cached {stage_name} artifact {os.path.basename(entry_dir)[:12]}")
+
+    def write_report(self, file_path: str) -> None:
+
+        """
+        Method Name :   write_report
+
+        Description :   This method writes which stages were reused from the cache and which ran,
+                        and logs a one line summary.
+
+        Output      :   None
+        """
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            report = {
+                "code_version": self.code_version,
+                "cache_dir": self.cache_dir,
+                "hits": sum(entry["hit"] for entry in self.report),
+                "misses": sum(not entry["hit"] for entry in self.report),
+                "stages": self.report,
+            }
+            with open(file_path, "w") as report_file:
+                json.dump(report, report_file, indent=2, default=str)
+            summary = ", ".join(
+                f"{entry['stage']} {'hit' if entry['hit'] else 'miss'}" for entry in self.report
+            )
+            logging.info(f"Stage cache: {summary}")
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
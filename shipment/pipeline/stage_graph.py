@@ -0,0 +1,139 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Set
+from shipment.logger import logging
+
+
+class StageCancelled(Exception):
+    pass
+
+
+def check_cancelled(cancel_event: Optional[threading.Event]) -> None:
+    # Long running stages call this between their steps, to stop soon after a sibling stage failed
+    if cancel_event is not None and cancel_event.is_set():
+        raise StageCancelled("Stage cancelled after another stage failed")
+
+
+@dataclass
+class Stage:
+    name: str
+    function: Callable
+    # Keyword argument of function -> stage whose artifact it receives
+    inputs: Dict[str, str] = field(default_factory=dict)
+    # Stages that must finish first without passing their artifact on
+    after: Sequence[str] = ()
+    # Called with the artifacts so far, the stage and its dependents are skipped when it is false
+    condition: Optional[Callable[[Dict[str, object]], bool]] = None
+
+    @property
+    def dependencies(self) -> Set[str]:
+        return set(self.inputs.values()) | set(self.after)
+
+
+class StageGraph:
+    def __init__(self, stages: List[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+        for stage in stages:
+            unknown = stage.dependencies - set(self.stages)
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages {sorted(unknown)}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order, visiting, visited = [], set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through {name}")
+            visiting.add(name)
+            for dependency in sorted(self.stages[name].dependencies):
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def run(
+        self,
+        run_stage: Callable,
+        max_workers: int,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Dict[str, object]:
+
+        """
+        Method Name :   run
+
+        Description :   This method runs every stage once all the stages it depends on have
+                        finished, independent stages concurrently on up to max_workers threads.
+                        run_stage(name, function, **inputs) runs one stage. When a stage fails,
+                        stages not started yet are cancelled and cancel_event is set, running
+                        stages check it between their steps with check_cancelled. The error is
+                        raised once they have stopped, no stage outlives the run.
+
+        Output      :   Artifact of every stage by name, None for skipped stages
+        """
+        if cancel_event is None:
+            cancel_event = threading.Event()
+        results: Dict[str, object] = {}
+        skipped: Set[str] = set()
+        pending = list(self.order)
+        running: Dict[Future, str] = {}
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage")
+        try:
+            while pending or running:
+                # Submits every stage whose dependencies are done, skipping may make more ready
+                progress = True
+                while progress:
+                    progress = False
+                    for name in list(pending):
+                        stage = self.stages[name]
+                        if not stage.dependencies <= set(results):
+                            continue
+                        pending.remove(name)
+                        progress = True
+                        if stage.dependencies & skipped or (
+                            stage.condition is not None and not stage.condition(results)
+                        ):
+                            logging.info(f"Skipped stage {name}")
+                            skipped.add(name)
+                            results[name] = None
+                            continue
+                        inputs = {
+                            argument: results[source] for argument, source in stage.inputs.items()
+                        }
+                        running[executor.submit(run_stage, name, stage.function, **inputs)] = name
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        cancelled = [running[sibling] for sibling in running if sibling.cancel()]
+                        stopping = [
+                            running[sibling] for sibling in running if not sibling.cancelled()
+                        ]
+                        logging.error(
+                            f"Stage {name} failed, cancelled {cancelled + pending}, "
+                            f"stopping {stopping}"
+                        )
+                        raise error
+                    results[name] = future.result()
+            return results
+
+        except BaseException:
+            cancel_event.set()
+            raise
+
+        finally:
+            # Running stages see cancel_event and stop at their next check, their errors are dropped
+            executor.shutdown(wait=True, cancel_futures=True)
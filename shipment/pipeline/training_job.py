@@ -0,0 +1,224 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+from shipment.constant import (
+    ARTIFACTS_ROOT_DIR,
+    TRAINING_JOBS_DIR,
+    TRAINING_MAX_CONCURRENT_JOBS,
+    TRAINING_MAX_FINISHED_JOBS,
+)
+from shipment.logger import logging
+from shipment.utils.metrics import TRAINING_STAGE_LATENCY
+
+
+@dataclass
+class TrainingJob:
+    job_id: str
+    artifacts_dir: str
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stages: Dict[str, Dict] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+# Queue the worker processes report job progress on, set by the pool initializer
+_event_queue = None
+
+
+def _init_worker(event_queue) -> None:
+    global _event_queue
+    _event_queue = event_queue
+
+
+def _acquire_slot(jobs_dir: str, max_concurrent_jobs: int):
+    # Every server worker has its own pool, so the service wide limit is a set of slot files locked
+    # by the running jobs. The kernel releases the lock when the job process exits, even on a crash
+    os.makedirs(jobs_dir, exist_ok=True)
+    while True:
+        for slot in range(max_concurrent_jobs):
+            slot_file = open(os.path.join(jobs_dir, f"slot_{slot}.lock"), "a")
+            try:
+                fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot_file
+            except BlockingIOError:
+                slot_file.close()
+        time.sleep(1.0)
+
+
+def _run_training_job(
+    job_id: str, artifacts_dir: str, jobs_dir: str, max_concurrent_jobs: int
+) -> None:
+    def stage_callback(stage_name: str, status: str, elapsed: Optional[float]) -> None:
+        _event_queue.put((job_id, stage_name, status, elapsed, time.time()))
+
+    slot_file = _acquire_slot(jobs_dir, max_concurrent_jobs)
+    _event_queue.put((job_id, None, "running", None, time.time()))
+    try:
+        # Training dependencies are imported in the worker only, never in the serving process
+        from shipment.pipeline.training_pipeline import TrainPipeline
+
+        TrainPipeline(artifacts_dir=artifacts_dir, stage_callback=stage_callback).run_pipeline()
+    except Exception as e:
+        # shippingException cannot be unpickled by the parent, pass its message on instead
+        raise RuntimeError(str(e)) from None
+    finally:
+        slot_file.close()
+
+
+class TrainingJobManager:
+    def __init__(
+        self,
+        max_concurrent_jobs: int = TRAINING_MAX_CONCURRENT_JOBS,
+        jobs_dir: str = TRAINING_JOBS_DIR,
+        max_finished_jobs: int = TRAINING_MAX_FINISHED_JOBS,
+    ):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.jobs_dir = jobs_dir
+        self.max_finished_jobs = max_finished_jobs
+        # Jobs submitted by this server worker, the status of every job is read from jobs_dir
+        self._jobs: Dict[str, TrainingJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._event_queue = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned processes start clean, so every job gets fresh module state
+            mp_context = multiprocessing.get_context("spawn")
+            self._event_queue = mp_context.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_concurrent_jobs,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(self._event_queue,),
+                max_tasks_per_child=1,
+            )
+            threading.Thread(
+                target=self._consume_events, name="training-job-events", daemon=True
+            ).start()
+        return self._executor
+
+    def submit(self) -> TrainingJob:
+
+        """
+        Method Name :   submit
+
+        Description :   This method queues a training pipeline run in a worker process with its own
+                        artifacts directory. At most max_concurrent_jobs runs execute at once, over
+                        all the server workers sharing jobs_dir.
+
+        Output      :   Training job
+        """
+        logging.info("Entered the submit method of TrainingJobManager class")
+        job_id = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}_{uuid.uuid4().hex[:8]}"
+        job = TrainingJob(job_id=job_id, artifacts_dir=os.path.join(ARTIFACTS_ROOT_DIR, job_id))
+        with self._lock:
+            executor = self._get_executor()
+            self._jobs[job_id] = job
+            self._save(job)
+            future = executor.submit(
+                _run_training_job,
+                job_id,
+                job.artifacts_dir,
+                self.jobs_dir,
+                self.max_concurrent_jobs,
+            )
+        future.add_done_callback(lambda future: self._on_job_done(job_id, future))
+        logging.info(f"Queued training job {job_id}")
+        return job
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job: TrainingJob) -> None:
+        # Written aside and renamed, so a worker reading the status never sees half a file
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        temporary_path = f"{self._job_path(job.job_id)}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as status_file:
+            json.dump(asdict(job), status_file)
+        os.replace(temporary_path, self._job_path(job.job_id))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        # Job ids come from the url, anything that is not a plain file name is unknown
+        if os.path.basename(job_id) != job_id or job_id.startswith("."):
+            return None
+        try:
+            with open(self._job_path(job_id)) as status_file:
+                return json.load(status_file)
+        except FileNotFoundError:
+            return None
+
+    def list_jobs(self) -> List[Dict]:
+        jobs = []
+        if os.path.isdir(self.jobs_dir):
+            for file_name in os.listdir(self.jobs_dir):
+                job = self.get(file_name[: -len(".json")]) if file_name.endswith(".json") else None
+                if job is not None:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job["created_at"])
+
+    def _prune(self) -> None:
+        # Only the status of the most recently finished jobs is kept, their artifacts stay
+        finished = [job for job in self.list_jobs() if job["finished_at"] is not None]
+        finished.sort(key=lambda job: job["finished_at"], reverse=True)
+        for job in finished[self.max_finished_jobs :]:
+            self._jobs.pop(job["job_id"], None)
+            try:
+                os.remove(self._job_path(job["job_id"]))
+            except FileNotFoundError:
+                pass
+
+    def _consume_events(self) -> None:
+        while True:
+            job_id, stage_name, status, elapsed, timestamp = self._event_queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if stage_name is None:
+                    # The completion callback may already have run for a very short job
+                    if job.status == "queued":
+                        job.status = status
+                    job.started_at = timestamp
+                    self._save(job)
+                    continue
+                stage = job.stages.setdefault(stage_name, {})
+                stage["status"] = status
+                if status == "running":
+                    stage["started_at"] = timestamp
+                else:
+                    stage["finished_at"] = timestamp
+                    stage["duration_seconds"] = elapsed
+                    # Stages run in the job process, their durations reach /metrics through the events
+                    TRAINING_STAGE_LATENCY.labels(stage_name, status).observe(elapsed)
+                self._save(job)
+
+    def _on_job_done(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.finished_at = time.time()
+            error = "Job was cancelled" if future.cancelled() else future.exception()
+            if error is None:
+                job.status = "completed"
+                logging.info(f"Training job {job_id} completed")
+            else:
+                job.status = "failed"
+                job.error = str(error)
+                logging.error(f"Training job {job_id} failed: {error}")
+            self._save(job)
+            self._prune()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
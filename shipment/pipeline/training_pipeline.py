@@ -1,6 +1,25 @@
+import os
 import sys
+import threading
+import time
+from functools import partial
+from typing import Callable, Optional
+from shipment.constant import (
+    ARTIFACTS_DIR,
+    COMPILED_MODEL_MAX_ROWS,
+    MODEL_CONFIG_FILE,
+    MODEL_EARLY_STOPPING_ROUNDS,
+    MODEL_EARLY_STOPPING_VALIDATION_SIZE,
+    MODEL_SEARCH_CV,
+    MODEL_SEARCH_MAX_SECONDS,
+    SCHEMA_FILE_PATH,
+    STAGE_CACHE_REPORT_FILE_NAME,
+    TEST_SIZE,
+    TRAINING_STAGE_WORKERS,
+)
 from shipment.exception import shippingException
 from shipment.logger import logging
+from shipment.utils.metrics import TRAINING_STAGE_LATENCY
 from shipment.configuration.mongo_operation import mongoDBOperation
 from shipment.entity.artifacts_entity import (
     DataIngestionArtifacts,
@@ -24,22 +43,59 @@ from shipment.component.data_ingestion import DataIngestion
 from shipment.component.data_validation import DataValidation
 from shipment.component.data_transformation import DataTransformation
 from shipment.component.model_trainer import ModelTrainer
-from shipment.component.model_evaluation import ModelEvaluation
+from shipment.component.model_evaluation import S3_MODEL_NOT_FETCHED, ModelEvaluation
 from shipment.configuration.s3_operation import S3Operation
 from shipment.component.model_pusher import ModelPusher
+from shipment.pipeline.stage_cache import StageCache, hash_data_frame, hash_file
+from shipment.pipeline.stage_graph import Stage, StageGraph, check_cancelled
 
 
 class TrainPipeline:
-    def __init__(self):
-        self.data_ingestion_config = DataIngestionConfig()
-        self.data_validation_config = DataValidationConfig()
-        self.data_transformation_config = DataTransformationConfig()
-        self.model_trainer_config = ModelTrainerConfig()
-        self.model_evaluation_config = ModelEvaluationConfig()
-        self.model_pusher_config = ModelPusherConfig()
+    def __init__(
+        self,
+        artifacts_dir: str = ARTIFACTS_DIR,
+        stage_callback: Optional[Callable[[str, str, Optional[float]], None]] = None,
+        stage_cache: Optional[StageCache] = None,
+    ):
+        self.artifacts_dir = artifacts_dir
+        self.stage_callback = stage_callback
+        self.stage_cache = stage_cache or StageCache()
+        # Set when a stage fails, the stages still running stop at their next check
+        self.cancel_event = threading.Event()
+        self.data_ingestion_config = DataIngestionConfig(artifacts_dir)
+        self.data_validation_config = DataValidationConfig(artifacts_dir)
+        self.data_transformation_config = DataTransformationConfig(artifacts_dir)
+        self.model_trainer_config = ModelTrainerConfig(artifacts_dir)
+        self.model_evaluation_config = ModelEvaluationConfig(artifacts_dir)
+        self.model_pusher_config = ModelPusherConfig(artifacts_dir)
         self.s3_operations = S3Operation()
         self.mongo_op = mongoDBOperation()
 
+    # This method runs one stage and reports its status and duration to the stage callback
+    def run_stage(self, stage_name: str, stage_function: Callable, **kwargs) -> object:
+        check_cancelled(self.cancel_event)
+        if self.stage_callback is not None:
+            self.stage_callback(stage_name, "running", None)
+        start_time = time.perf_counter()
+        try:
+            stage_artifact = stage_function(**kwargs)
+
+        except Exception:
+            elapsed = time.perf_counter() - start_time
+            # The stage that failed first sets the event, the ones stopped by it are cancelled
+            status = "cancelled" if self.cancel_event.is_set() else "failed"
+            TRAINING_STAGE_LATENCY.labels(stage_name, status).observe(elapsed)
+            if self.stage_callback is not None:
+                self.stage_callback(stage_name, status, elapsed)
+            raise
+
+        elapsed = time.perf_counter() - start_time
+        status = "cached" if self.stage_cache.is_hit(stage_name) else "completed"
+        TRAINING_STAGE_LATENCY.labels(stage_name, status).observe(elapsed)
+        if self.stage_callback is not None:
+            self.stage_callback(stage_name, status, elapsed)
+        return stage_artifact
+
     
     # This method is used to start the data ingestion
     def start_data_ingestion(self) -> DataIngestionArtifacts:
@@ -49,7 +105,20 @@ class TrainPipeline:
             data_ingestion = DataIngestion(
                 data_ingestion_config=self.data_ingestion_config, mongo_op=self.mongo_op
             )
-            data_ingestion_artifact = data_ingestion.initiate_data_ingestion()
+            # The collection is always fetched, its content decides whether the split is reused
+            df = data_ingestion.get_data_from_mongodb()
+            data_ingestion_artifact = self.stage_cache.run(
+                "data_ingestion",
+                {
+                    "data": hash_data_frame(df),
+                    "schema": hash_file(SCHEMA_FILE_PATH),
+                    "test_size": TEST_SIZE,
+                },
+                DataIngestionArtifacts,
+                data_ingestion.initiate_data_ingestion,
+                cancel_event=self.cancel_event,
+                df=df,
+            )
             logging.info("Got the train_set and test_set from mongodb")
             logging.info("Exited the start_data_ingestion method of TrainPipeline class")
             return data_ingestion_artifact
@@ -67,7 +136,17 @@ class TrainPipeline:
                 data_ingestion_artifacts=data_ingestion_artifact,
                 data_validation_config=self.data_validation_config,
             )
-            data_validation_artifact = data_validation.initiate_data_validation()
+            data_validation_artifact = self.stage_cache.run(
+                "data_validation",
+                {
+                    "train": hash_file(data_ingestion_artifact.train_data_file_path),
+                    "test": hash_file(data_ingestion_artifact.test_data_file_path),
+                    "schema": hash_file(SCHEMA_FILE_PATH),
+                },
+                DataValidationArtifacts,
+                data_validation.initiate_data_validation,
+                cancel_event=self.cancel_event,
+            )
             logging.info("Performed the data validation operation")
             logging.info(
                 "Exited the start_data_validation method of TrainPipeline class"
@@ -90,8 +169,16 @@ class TrainPipeline:
                 data_ingestion_artifacts=data_ingestion_artifact,
                 data_transformation_config=self.data_transformation_config,
             )
-            data_transformation_artifact = (
-                data_transformation.initiate_data_transformation()
+            data_transformation_artifact = self.stage_cache.run(
+                "data_transformation",
+                {
+                    "train": hash_file(data_ingestion_artifact.train_data_file_path),
+                    "test": hash_file(data_ingestion_artifact.test_data_file_path),
+                    "schema": hash_file(SCHEMA_FILE_PATH),
+                },
+                DataTransformationArtifacts,
+                data_transformation.initiate_data_transformation,
+                cancel_event=self.cancel_event,
             )
             logging.info(
                 "Exited the start_data_transformation method of TrainPipeline class"
@@ -110,19 +197,59 @@ class TrainPipeline:
             model_trainer = ModelTrainer(
                 data_transformation_artifact=data_transformation_artifact,
                 model_trainer_config=self.model_trainer_config,
+                cancel_event=self.cancel_event,
+            )
+            model_trainer_artifact = self.stage_cache.run(
+                "model_trainer",
+                {
+                    "train": hash_file(data_transformation_artifact.transformed_train_file_path),
+                    "test": hash_file(data_transformation_artifact.transformed_test_file_path),
+                    "preprocessor": hash_file(
+                        data_transformation_artifact.transformed_object_file_path
+                    ),
+                    "compiled_preprocessor": (
+                        None
+                        if data_transformation_artifact.compiled_object_file_path is None
+                        else hash_file(data_transformation_artifact.compiled_object_file_path)
+                    ),
+                    "model_config": hash_file(MODEL_CONFIG_FILE),
+                    # Settings read from the environment change the trained model like model.yaml
+                    "search_cv": MODEL_SEARCH_CV,
+                    "search_max_seconds": MODEL_SEARCH_MAX_SECONDS,
+                    "early_stopping_rounds": MODEL_EARLY_STOPPING_ROUNDS,
+                    "early_stopping_validation_size": MODEL_EARLY_STOPPING_VALIDATION_SIZE,
+                    "compiled_model_max_rows": COMPILED_MODEL_MAX_ROWS,
+                },
+                ModelTrainerArtifacts,
+                model_trainer.initiate_model_trainer,
+                cancel_event=self.cancel_event,
             )
-            model_trainer_artifact = model_trainer.initiate_model_trainer()
             return model_trainer_artifact
 
         except Exception as e:
             raise shippingException(e, sys) from e
 
     
+    # This method is used to fetch the production model from s3, independently of the other stages
+    def start_s3_model_fetch(self) -> object:
+        try:
+            model_evaluation = ModelEvaluation(
+                model_evaluation_config=self.model_evaluation_config,
+                data_ingestion_artifact=None,
+                model_trainer_artifact=None,
+            )
+            return model_evaluation.get_s3_model()
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
+
+
     # This method is used to start the model evaluation
     def start_model_evaluation(
         self,
         data_ingestion_artifact: DataIngestionArtifacts,
         model_trainer_artifact: ModelTrainerArtifacts,
+        s3_model: object = S3_MODEL_NOT_FETCHED,
     ) -> ModelEvaluationArtifact:
         try:
             model_evaluation = ModelEvaluation(
@@ -130,7 +257,7 @@ class TrainPipeline:
                 data_ingestion_artifact=data_ingestion_artifact,
                 model_trainer_artifact=model_trainer_artifact,
             )
-            model_evaluation_artifact = model_evaluation.initiate_model_evaluation()
+            model_evaluation_artifact = model_evaluation.initiate_model_evaluation(s3_model)
             return model_evaluation_artifact
 
         except Exception as e:
@@ -166,35 +293,63 @@ class TrainPipeline:
     def run_pipeline(self) -> None:
         logging.info("Entered the run_pipeline method of TrainPipeline class")
         try:
-            data_ingestion_artifact = self.start_data_ingestion()
-            data_validation_artifact = self.start_data_validation(
-                data_ingestion_artifact=data_ingestion_artifact
-            )
-            data_transformation_artifact = self.start_data_transformation(
-                data_ingestion_artifact=data_ingestion_artifact
-            )
-
-            model_trainer_artifact = self.start_model_trainer(
-                data_transformation_artifact=data_transformation_artifact
-            )
-
-            model_evaluation_artifact = self.start_model_evaluation(
-                data_ingestion_artifact=data_ingestion_artifact,
-                model_trainer_artifact=model_trainer_artifact,
+            # The production model is fetched from s3 while the data is ingested, validated and
+            # transformed, validation only has to pass before the evaluation
+            graph = StageGraph(
+                [
+                    Stage("data_ingestion", self.start_data_ingestion),
+                    Stage("s3_model", self.start_s3_model_fetch),
+                    Stage(
+                        "data_validation",
+                        self.start_data_validation,
+                        inputs={"data_ingestion_artifact": "data_ingestion"},
+                    ),
+                    Stage(
+                        "data_transformation",
+                        self.start_data_transformation,
+                        inputs={"data_ingestion_artifact": "data_ingestion"},
+                    ),
+                    Stage(
+                        "model_trainer",
+                        self.start_model_trainer,
+                        inputs={"data_transformation_artifact": "data_transformation"},
+                    ),
+                    Stage(
+                        "model_evaluation",
+                        self.start_model_evaluation,
+                        inputs={
+                            "data_ingestion_artifact": "data_ingestion",
+                            "model_trainer_artifact": "model_trainer",
+                            "s3_model": "s3_model",
+                        },
+                        after=("data_validation",),
+                    ),
+                    Stage(
+                        "model_pusher",
+                        partial(self.start_model_pusher, s3=self.s3_operations),
+                        inputs={
+                            "model_trainer_artifacts": "model_trainer",
+                            "data_transformation_artifacts": "data_transformation",
+                        },
+                        after=("model_evaluation",),
+                        condition=lambda results: results["model_evaluation"].is_model_accepted,
+                    ),
+                ]
             )
+            results = graph.run(self.run_stage, TRAINING_STAGE_WORKERS, self.cancel_event)
 
-            if not model_evaluation_artifact.is_model_accepted:
+            if results["model_pusher"] is None:
                 logging.info("Model not accepted")
                 return None
-            
-            model_pusher_artifact = self.start_model_pusher(
-                model_trainer_artifacts=model_trainer_artifact,
-                s3=self.s3_operations,
-                data_transformation_artifacts=data_transformation_artifact,
-            )
-
 
             logging.info("Exited the run_pipeline method of TrainPipeline class")
 
         except Exception as e:
-            raise shippingException(e, sys) from e     
+            raise shippingException(e, sys) from e
+
+        finally:
+            # Evaluation and pushing depend on the production model and are never cached
+            if self.stage_cache.enabled:
+                self.stage_cache.write_report(
+                    os.path.join(self.artifacts_dir, STAGE_CACHE_REPORT_FILE_NAME)
+                )     
@@ -0,0 +1,259 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Sequence
+from shipment.constant import (
+    ADMISSION_BURST_PER_CLIENT,
+    ADMISSION_CLIENT_HEADER,
+    ADMISSION_DEADLINE_MS,
+    ADMISSION_MAX_CLIENTS,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_RATE_PER_CLIENT,
+)
+from shipment.exception import AdmissionRejectedException
+from shipment.logger import logging
+from shipment.utils.metrics import ADMISSION_SHED_TOTAL
+from shipment.utils.serialization import FastJSONResponse
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+    def take(self, now: float, rate: float, burst: float) -> float:
+        # Seconds until a token is available, 0 when one was taken
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class AdmissionController:
+    # Weight of the latest request in the moving average of the service time, and seconds after
+    # which an estimate not updated since counts half, so one slow request cannot shed for long
+    SERVICE_TIME_SMOOTHING = 0.2
+    SERVICE_TIME_HALF_LIFE = 5.0
+
+    def __init__(
+        self,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        deadline_ms: Optional[float] = ADMISSION_DEADLINE_MS,
+        rate_per_client: float = ADMISSION_RATE_PER_CLIENT,
+        burst_per_client: float = ADMISSION_BURST_PER_CLIENT,
+        max_clients: int = ADMISSION_MAX_CLIENTS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline_ms = deadline_ms
+        self.rate_per_client = rate_per_client
+        self.burst_per_client = max(burst_per_client, 1.0)
+        self.max_clients = max_clients
+        # State is only touched from the event loop, so it needs no lock
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._service_time: Optional[float] = None
+        self._service_time_updated = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def service_time(self) -> float:
+        # Moving average of the service time, decayed by the time since its last update
+        if self._service_time is None:
+            return 0.0
+        age = time.monotonic() - self._service_time_updated
+        return self._service_time * 0.5 ** (age / self.SERVICE_TIME_HALF_LIFE)
+
+    def estimate_wait(self, queued: int) -> float:
+
+        """
+        Method Name :   estimate_wait
+
+        Description :   This method estimates how long a request waits for a slot when queued
+                        requests are ahead of it, from the moving average of the service time.
+
+        Output      :   Estimated wait in seconds
+        """
+        return self.service_time() * math.ceil((queued + 1) / self.max_concurrency)
+
+    def check_rate(self, client: str) -> None:
+        if self.rate_per_client <= 0:
+            return
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.burst_per_client, now)
+            # The least recently seen clients are dropped, their buckets would be full again anyway
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        retry_after = bucket.take(now, self.rate_per_client, self.burst_per_client)
+        if retry_after:
+            self._reject(
+                429,
+                "rate_limited",
+                retry_after,
+                f"Rate limit of {self.rate_per_client:g} requests per second exceeded",
+            )
+
+    async def acquire(self, deadline_ms: Optional[float] = -1) -> None:
+
+        """
+        Method Name :   acquire
+
+        Description :   This method takes a concurrency slot, waiting in FIFO order when all are
+                        taken. Requests are shed up front when the queue is full or when the
+                        estimated wait already exceeds the deadline, and once they waited that long.
+                        A deadline_ms of None disables the deadline, -1 uses the default one.
+
+        Output      :   None, raises AdmissionRejectedException when the request is shed
+        """
+        if deadline_ms == -1:
+            deadline_ms = self.deadline_ms
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return
+
+        estimated_wait = self.estimate_wait(len(self._waiters))
+        if len(self._waiters) >= self.max_queue:
+            self._reject(
+                503,
+                "queue_full",
+                estimated_wait,
+                f"Admission queue is full with {len(self._waiters)} waiting requests",
+            )
+        if deadline_ms is not None and estimated_wait * 1000 > deadline_ms:
+            self._reject(
+                503,
+                "estimated_wait",
+                estimated_wait,
+                f"Estimated wait of {estimated_wait * 1000:.0f} ms exceeds the {deadline_ms:.0f} ms deadline",
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release hands its slot straight to the first waiter, active is not decremented
+            await asyncio.wait_for(waiter, None if deadline_ms is None else deadline_ms / 1000)
+        except asyncio.TimeoutError:
+            self._pass_on_slot(waiter)
+            self._reject(
+                503,
+                "queue_timeout",
+                self.estimate_wait(len(self._waiters)),
+                f"No capacity within the {deadline_ms:.0f} ms deadline",
+            )
+        except asyncio.CancelledError:
+            # The client went away while waiting
+            self._pass_on_slot(waiter)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _pass_on_slot(self, waiter: asyncio.Future) -> None:
+        # A slot handed over just before the wait was abandoned goes to the next waiter
+        if waiter.done() and not waiter.cancelled():
+            self.release()
+
+    def release(self, elapsed: Optional[float] = None) -> None:
+        if elapsed is not None:
+            # The average moves on from its decayed value, so a stale high estimate does not linger
+            if self._service_time is None:
+                self._service_time = elapsed
+            else:
+                current = self.service_time()
+                self._service_time = current + self.SERVICE_TIME_SMOOTHING * (elapsed - current)
+            self._service_time_updated = time.monotonic()
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @staticmethod
+    def _reject(status_code: int, reason: str, retry_after: float, message: str) -> None:
+        ADMISSION_SHED_TOTAL.labels(reason).inc()
+        raise AdmissionRejectedException(message, status_code, reason, retry_after)
+
+
+class AdmissionControlMiddleware:
+    # Plain ASGI middleware, only the POST requests to the prediction routes are admitted. Bulk and
+    # streaming routes take a slot like the others, but they hold it for as long as their upload
+    # lasts, so their time is left out of the service time estimate
+    def __init__(
+        self,
+        app,
+        admission_controller: AdmissionController,
+        path_prefixes: Sequence[str] = ("/predict",),
+        methods: Sequence[str] = ("POST",),
+        client_header: str = ADMISSION_CLIENT_HEADER,
+        untimed_paths: Sequence[str] = ("/predict/batch", "/predict/stream", "/predict/arrow"),
+    ):
+        self.app = app
+        self.admission_controller = admission_controller
+        self.path_prefixes = tuple(path_prefixes)
+        self.untimed_paths = tuple(untimed_paths)
+        self.methods = tuple(methods)
+        self.client_header = client_header.encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or not scope["path"].startswith(self.path_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        client, deadline_ms = None, -1
+        for name, value in scope["headers"]:
+            if name == self.client_header:
+                client = value.decode("latin-1")
+            elif name == b"x-deadline-ms":
+                try:
+                    header_deadline_ms = float(value)
+                except ValueError:
+                    continue
+                # nan would disable every comparison with the deadline and inf the deadline itself
+                if math.isfinite(header_deadline_ms):
+                    deadline_ms = min(
+                        header_deadline_ms, self.admission_controller.deadline_ms or math.inf
+                    )
+        if client is None:
+            client = scope["client"][0] if scope.get("client") else "unknown"
+
+        try:
+            self.admission_controller.check_rate(client)
+            await self.admission_controller.acquire(deadline_ms)
+        except AdmissionRejectedException as e:
+            logging.warning(f"Shed {scope['path']} request of {client}: {e}")
+            retry_after = str(max(1, math.ceil(e.retry_after)))
+            response = FastJSONResponse(
+                {"status": False, "error": f"{e}", "reason": e.reason},
+                status_code=e.status_code,
+                headers={"Retry-After": retry_after},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        elapsed = None
+        try:
+            await self.app(scope, receive, send)
+            if not scope["path"].startswith(self.untimed_paths):
+                elapsed = time.perf_counter() - start
+        finally:
+            self.admission_controller.release(elapsed)
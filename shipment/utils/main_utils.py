@@ -1,15 +1,10 @@
 import shutil
 import sys 
-from typing import List, Dict,Tuple
-import dill
-import xgboost
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 import pandas as pd
 import yaml
 from pandas import DataFrame
-from sklearn.metrics import r2_score
-from sklearn.model_selection import GridSearchCV
-from sklearn.utils import all_estimators
 from yaml import safe_dump
 from shipment.constant import *
 from shipment.exception import shippingException
@@ -67,13 +62,25 @@ class Mainutils:
                         train_y:DataFrame,
                         test_x:DataFrame,
                         test_y:DataFrame,
+                        n_jobs:int=-1,
                         )-> Tuple[float,object,str]:
         logging.info("Entered the get_tuned_model method of Mainutils class")
         try:
+            from sklearn.base import clone
+
             model = self.get_base_model(model_name)
-            model_best_params = self.get_model_params(model,train_x,train_y,test_x,test_y)
-            model.set_params(**model_best_params)
-            model.fit(train_x, train_y)
+            # The search refits the best parameters on the whole train set and that model is kept,
+            # boosting models are fitted once with early stopping instead
+            early_stopping = MODEL_EARLY_STOPPING_ROUNDS > 0 and self.supports_early_stopping(model)
+            model_search = self.get_model_search(
+                model, train_x, train_y, n_jobs, refit=not early_stopping
+            )
+            if early_stopping:
+                model = self.fit_with_early_stopping(
+                    clone(model).set_params(**model_search.best_params_), train_x, train_y, n_jobs
+                )
+            else:
+                model = model_search.best_estimator_
             preds = model.predict(test_x)
             model_score = self.get_model_score(test_y, preds)
             logging.info("Exiting the get_tuned_model method of Mainutils class")
@@ -83,9 +90,11 @@ class Mainutils:
             raise shippingException(e, sys) from e
 
     @staticmethod  
-    def get_model_score(self, test_y:DataFrame, preds:DataFrame)->float:
+    def get_model_score(test_y:DataFrame, preds:DataFrame)->float:
         logging.info("Entered the get_model_score method of Mainutils class")
         try:
+            from sklearn.metrics import r2_score
+
             model_score = r2_score(test_y, preds)
             logging.info("Model score is {}".format(model_score))
             logging.info("Exiting the get_model_score method of Mainutils class")
@@ -95,14 +104,19 @@ class Mainutils:
             raise shippingException(e, sys) from e
         
     @staticmethod
-    def get_base_model(self, model_name:str)->object:
+    def get_base_model(model_name:str)->object:
         logging.info("Entered the get_base_model method of Mainutils class")
         try:
+            # Model libraries are imported on first use, they are only needed for training
             if model_name.lower().startswith("xgb") is True:
+                import xgboost
+
                 model = xgboost.__dict__[model_name]()
             else:
-                model_idx = [model[0] for model in all_estimators(type_filter='regressor')].index(model_name)
-                model = all_estimators().__getitem__(model_idx)[1]()
+                from sklearn.utils import all_estimators
+
+                # Looked up in the same filtered list the index comes from
+                model = dict(all_estimators(type_filter='regressor'))[model_name]()
             logging.info("Exiting the get_base_model method of Mainutils class")
             return model
         
@@ -110,27 +124,123 @@ class Mainutils:
             raise shippingException(e, sys) from e
     
 
+    @staticmethod
+    def get_thread_param(model:object)->Optional[str]:
+        # Parameter setting the size of the model's own thread pool, if it has one
+        if type(model).__module__.startswith("catboost"):
+            return "thread_count"
+        return "n_jobs" if "n_jobs" in model.get_params() else None
+
+    @staticmethod
+    def supports_early_stopping(model:object)->bool:
+        return type(model).__module__.split(".")[0] in ("xgboost", "catboost")
+
+    def get_model_search(self, model:object, x_train:DataFrame, y_train:DataFrame, n_jobs:int=-1, refit:bool=True)->object:
+        logging.info("Entered the get_model_search method of Mainutils class")
+        try:
+            model_name = model.__class__.__name__
+            model_config = self.read_yaml_file(filename=MODEL_CONFIG_FILE)
+            from joblib import parallel_config
+            from sklearn.base import clone
+            from shipment.utils.search_strategy import get_search
+
+            # Models with their own thread pool get all n_jobs threads and are fitted one at a time,
+            # the others are fitted n_jobs at a time on single threaded workers
+            thread_param = self.get_thread_param(model)
+            if thread_param is not None:
+                search_model = clone(model).set_params(**{thread_param: n_jobs})
+                search_jobs = 1
+            else:
+                search_model = model
+                search_jobs = n_jobs
+
+            # The search key of the model, or else of the whole file, sets the strategy and budget
+            model_search_config = dict(model_config["train_model"][model_name])
+            model_search_config.setdefault("search", model_config.get("search"))
+            model_grid = get_search(
+                search_model, model_search_config, n_jobs=search_jobs, refit=refit
+            )
+            with parallel_config(backend="loky", inner_max_num_threads=1):
+                model_grid.fit(x_train, y_train)
+
+            # The refitted model predicts with the library default number of threads again
+            if refit and thread_param is not None:
+                model_grid.best_estimator_.set_params(
+                    **{thread_param: model.get_params().get(thread_param, -1)}
+                )
+            logging.info(f"Best params of {model_name}: {model_grid.best_params_}")
+            logging.info("Exiting the get_model_search method of Mainutils class")
+            return model_grid
+        
+        except Exception as e:
+            raise shippingException(e, sys) from e  
+
+    def fit_with_early_stopping(self, model:object, x_train:DataFrame, y_train:DataFrame, n_jobs:int=-1)->object:
+        logging.info("Entered the fit_with_early_stopping method of Mainutils class")
+        try:
+            from sklearn.model_selection import train_test_split
+
+            x_fit, x_valid, y_fit, y_valid = train_test_split(
+                x_train, y_train, test_size=MODEL_EARLY_STOPPING_VALIDATION_SIZE, random_state=42
+            )
+            thread_param = self.get_thread_param(model)
+            default_threads = model.get_params().get(thread_param, -1)
+            model.set_params(**{thread_param: n_jobs})
+            max_rounds = model.get_params().get("n_estimators")
+
+            if type(model).__module__.startswith("catboost"):
+                # use_best_model shrinks the model to the best iteration
+                model.fit(
+                    x_fit,
+                    y_fit,
+                    eval_set=(x_valid, y_valid),
+                    early_stopping_rounds=MODEL_EARLY_STOPPING_ROUNDS,
+                    use_best_model=True,
+                    verbose=False,
+                )
+                best_iteration = model.get_best_iteration()
+            else:
+                model.set_params(early_stopping_rounds=MODEL_EARLY_STOPPING_ROUNDS)
+                model.fit(x_fit, y_fit, eval_set=[(x_valid, y_valid)], verbose=False)
+                best_iteration = model.best_iteration
+
+                # The rounds after the best one are dropped from the booster, the best iteration
+                # stays recorded on it
+                booster = model.get_booster()[: best_iteration + 1]
+                booster.set_attr(
+                    best_iteration=str(best_iteration),
+                    best_score=str(model.get_booster().attr("best_score")),
+                )
+                model.load_model(bytearray(booster.save_raw(raw_format="ubj")))
+                model.set_params(n_estimators=best_iteration + 1, early_stopping_rounds=None)
+
+            model.set_params(**{thread_param: default_threads})
+            logging.info(
+                f"Early stopping kept {best_iteration + 1} of {max_rounds or 'the default'} rounds "
+                f"of {model.__class__.__name__}"
+            )
+            logging.info("Exiting the fit_with_early_stopping method of Mainutils class")
+            return model
+
+        except Exception as e:
+            raise shippingException(e, sys) from e
+
     def get_model_params(self, model:object, x_train:DataFrame, y_train:DataFrame)->Dict:
         logging.info("Entered the get_model_params method of Mainutils class")
         try:
-            VERBOSE = 3
-            CV = 2
-            N_jOBS = -1
-            model_name = model.__class__.__name__
-            model_config = self.read_yaml_file(file_name=MODEL_CONFIG_FILE)
-            model_param_grid = model_config["train_model"][model_name]
-            model_grid = GridSearchCV(model, model_param_grid, verbose=VERBOSE, cv=CV, n_jobs=N_jOBS)
-            model_grid.fit(x_train, y_train)    
+            model_best_params = self.get_model_search(model, x_train, y_train).best_params_
             logging.info("Exiting the get_model_params method of Mainutils class")
-            return model_grid.best_params_
+            return model_best_params
         
         except Exception as e:
             raise shippingException(e, sys) from e  
     
     @staticmethod
-    def save_object(self, file_path:str, obj:object)->None:
+    def save_object(file_path:str, obj:object)->None:
         logging.info("Entered the save_object method of Mainutils class")
         try:
+            import dill
+
             with open(file_path, 'wb') as file_obj:
                 dill.dump(obj, file_obj)
                 logging.info("Exiting the save_object method of Mainutils class")
@@ -144,8 +254,8 @@ class Mainutils:
     def get_best_model_with_name_and_score(model_list:list)-> Tuple[object, str, float]:
         logging.info("Entered the get_best_model_with_name_and_score method of Mainutils class")
         try:
-            best_score = max(model_list)[0]
-            best_model = max(model_list)[1]
+            # Compared on the score only, models themselves cannot be ordered when scores tie
+            best_score, best_model = max(model_list, key=lambda item: item[0])[:2]
             logging.info("Exited the get_best_model_with_name_and_score method of Mainutils class")
             return best_model, best_score
         
@@ -157,6 +267,8 @@ class Mainutils:
     def load_object(file_path:str)->object:
         logging.info("Entered the load_object method of Mainutils class")
         try:
+            import dill
+
             with open(file_path, 'rb') as file_obj:
                 obj = dill.load(file_obj)
                 logging.info("Exited the load_object method of Mainutils class")
@@ -188,7 +300,7 @@ class Mainutils:
     def update_model_score(self, best_model_score:float)->None:
         logging.info("Entered the update_model_score method of Mainutils class")
         try:
-            model_config = self.read_yaml_file(file_name=MODEL_CONFIG_FILE)
+            model_config = self.read_yaml_file(filename=MODEL_CONFIG_FILE)
             model_config["base_model_score"] = str(best_model_score)
             with open(MODEL_CONFIG_FILE, 'w+') as fp:
                 safe_dump(model_config, fp, sort_keys=False)
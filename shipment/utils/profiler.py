@@ -0,0 +1,162 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+from shipment.constant import PROFILING_TRACEMALLOC_FRAMES, PROJECT_ROOT
+from shipment.exception import ProfilerBusyException
+from shipment.logger import logging
+
+# Leaf frames of threads that are blocked, not running, left out of CPU profiles unless asked for
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("connection.py", "_poll"),
+    ("connection.py", "_recv"),
+}
+
+
+def _short_path(file_name: str) -> str:
+    if file_name.startswith(PROJECT_ROOT + os.sep):
+        return os.path.relpath(file_name, PROJECT_ROOT)
+    _, site_packages, package_path = file_name.rpartition(f"site-packages{os.sep}")
+    if site_packages:
+        return package_path
+    return os.path.basename(file_name)
+
+
+class ServiceProfiler:
+    def __init__(self):
+        # One profile at a time, sampling and tracing are process wide
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _acquire(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyException("A profile is already running")
+
+    def profile_cpu(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> str:
+
+        """
+        Method Name :   profile_cpu
+
+        Description :   This method samples the stack of every thread of the process each interval
+                        seconds for the given duration, from a thread that only exists while
+                        profiling. Blocked threads are skipped unless include_idle is set.
+
+        Output      :   Collapsed stacks, one "thread;outer;...;inner count" line per distinct stack,
+                        the input format of flamegraph.pl and speedscope
+        """
+        self._acquire()
+        try:
+            logging.info(f"Started a {seconds:g} s CPU profile sampling every {interval * 1000:g} ms")
+            stacks: Counter = Counter()
+            profiler_thread = threading.get_ident()
+            thread_names: Dict[int, str] = {}
+            frame_labels: Dict[tuple, str] = {}
+            n_samples = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                if len(thread_names) != threading.active_count():
+                    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == profiler_thread:
+                        continue
+                    code = frame.f_code
+                    leaf = (os.path.basename(code.co_filename), code.co_name)
+                    if not include_idle and leaf in IDLE_FRAMES:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        code = frame.f_code
+                        key = (code, frame.f_lineno)
+                        label = frame_labels.get(key)
+                        if label is None:
+                            label = frame_labels[key] = (
+                                f"{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})"
+                            )
+                        labels.append(label)
+                        frame = frame.f_back
+                    labels.append(thread_names.get(thread_id, str(thread_id)))
+                    stacks[";".join(reversed(labels))] += 1
+                n_samples += 1
+                time.sleep(interval)
+
+            logging.info(
+                f"Finished the CPU profile with {n_samples} samples, {len(stacks)} distinct stacks"
+            )
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+    def profile_memory(self, seconds: float, top: int = 50, group_by: str = "traceback") -> Dict:
+
+        """
+        Method Name :   profile_memory
+
+        Description :   This method traces the allocations made during the given duration with
+                        tracemalloc, which is only started for the profile, and groups the memory
+                        still allocated at the end by allocation site or by traceback.
+
+        Output      :   Top allocation sites and the collapsed allocation stacks weighted by bytes
+        """
+        if group_by not in ("traceback", "lineno", "filename"):
+            raise ValueError(f"Unknown grouping {group_by}")
+        self._acquire()
+        try:
+            if tracemalloc.is_tracing():
+                raise ProfilerBusyException("tracemalloc is already tracing in this process")
+            logging.info(f"Started a {seconds:g} s allocation profile")
+            tracemalloc.start(PROFILING_TRACEMALLOC_FRAMES)
+            try:
+                time.sleep(seconds)
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            snapshot = snapshot.filter_traces(
+                [
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                ]
+            )
+            statistics = snapshot.statistics(group_by)
+            top_sites: List[Dict] = [
+                {
+                    "size_kb": round(statistic.size / 1024, 1),
+                    "count": statistic.count,
+                    "traceback": [
+                        f"{_short_path(frame.filename)}:{frame.lineno}"
+                        for frame in reversed(statistic.traceback)
+                    ],
+                }
+                for statistic in statistics[:top]
+            ]
+            collapsed = Counter()
+            for statistic in snapshot.statistics("traceback"):
+                stack = ";".join(
+                    f"{_short_path(frame.filename)}:{frame.lineno}"
+                    for frame in reversed(statistic.traceback)
+                )
+                collapsed[stack] += statistic.size
+
+            logging.info(f"Finished the allocation profile, {len(statistics)} allocation sites")
+            return {
+                "seconds": seconds,
+                "group_by": group_by,
+                "traced_kb": round(sum(statistic.size for statistic in statistics) / 1024, 1),
+                "peak_kb": round(peak / 1024, 1),
+                "top": top_sites,
+                "collapsed": "".join(f"{stack} {size}\n" for stack, size in collapsed.most_common()),
+            }
+        finally:
+            self._lock.release()
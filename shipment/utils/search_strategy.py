@@ -0,0 +1,226 @@
+import importlib.util
+import time
+from typing import Dict, Optional
+import numpy as np
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import (
+    GridSearchCV,
+    HalvingGridSearchCV,
+    RandomizedSearchCV,
+    cross_val_score,
+)
+from shipment.constant import MODEL_SEARCH_CV, MODEL_SEARCH_MAX_SECONDS
+from shipment.logger import logging
+
+SEARCH_STRATEGIES = ("grid", "random", "halving", "bayesian")
+# Printed by the sklearn searches for every fit, as the GridSearchCV of the trainer always did
+SEARCH_VERBOSE = 3
+
+
+def _is_range(values) -> bool:
+    return isinstance(values, dict)
+
+
+def _is_int_range(values: Dict) -> bool:
+    return isinstance(values["low"], int) and isinstance(values["high"], int)
+
+
+class _TimeBudget:
+    # Mixed into the sklearn searches: with max_seconds the candidates are evaluated a batch that
+    # fills the n_jobs workers at a time, and no batch but the first is started once max_seconds
+    # have passed, so there is always a best candidate
+    max_seconds: Optional[float] = None
+
+    def _run_search(self, evaluate_candidates, *, callback_ctx=None) -> None:
+        # Newer sklearn passes a callback context, which is handed on unchanged
+        context = {} if callback_ctx is None else {"callback_ctx": callback_ctx}
+        if not self.max_seconds:
+            super()._run_search(evaluate_candidates, **context)
+            return
+        from joblib import effective_n_jobs
+
+        deadline = time.monotonic() + self.max_seconds
+        batch_size = max(1, effective_n_jobs(self.n_jobs))
+        # Batches run so far and the results of the latest, halving picks the next rung from them
+        n_batches, results = [0], [None]
+
+        def evaluate_within_budget(candidate_params, *args, **kwargs):
+            candidate_params = list(candidate_params)
+            for start in range(0, len(candidate_params), batch_size):
+                if n_batches[0] and time.monotonic() >= deadline:
+                    logging.info(
+                        f"Search time budget of {self.max_seconds}s spent, "
+                        f"{len(candidate_params) - start} candidates left out"
+                    )
+                    break
+                batch_kwargs = dict(kwargs)
+                if start:
+                    # A callback context only takes one set of candidates, later batches go without
+                    batch_kwargs.pop("callback_ctx", None)
+                if kwargs.get("more_results"):
+                    # Halving records the rung of every candidate, sliced like the candidates
+                    batch_kwargs["more_results"] = {
+                        key: values[start : start + batch_size]
+                        for key, values in kwargs["more_results"].items()
+                    }
+                results[0] = evaluate_candidates(
+                    candidate_params[start : start + batch_size], *args, **batch_kwargs
+                )
+                n_batches[0] += 1
+            return results[0]
+
+        super()._run_search(evaluate_within_budget, **context)
+
+
+class BudgetedGridSearchCV(_TimeBudget, GridSearchCV):
+    def __init__(self, estimator, param_grid, *, max_seconds: Optional[float] = None, **kwargs):
+        super().__init__(estimator, param_grid, **kwargs)
+        self.max_seconds = max_seconds
+
+
+class BudgetedRandomizedSearchCV(_TimeBudget, RandomizedSearchCV):
+    def __init__(
+        self, estimator, param_distributions, *, max_seconds: Optional[float] = None, **kwargs
+    ):
+        super().__init__(estimator, param_distributions, **kwargs)
+        self.max_seconds = max_seconds
+
+
+class BudgetedHalvingGridSearchCV(_TimeBudget, HalvingGridSearchCV):
+    def __init__(self, estimator, param_grid, *, max_seconds: Optional[float] = None, **kwargs):
+        super().__init__(estimator, param_grid, **kwargs)
+        self.max_seconds = max_seconds
+
+
+class BayesianSearchCV:
+    # optuna's TPE sampler proposes each candidate from the cross validation scores of the earlier
+    # ones, until n_iter candidates or max_seconds
+    def __init__(
+        self,
+        estimator: object,
+        param_space: Dict,
+        n_iter: int = 20,
+        max_seconds: Optional[float] = None,
+        cv: int = MODEL_SEARCH_CV,
+        n_jobs: int = 1,
+        refit: bool = True,
+        random_state: Optional[int] = 42,
+    ):
+        self.estimator = estimator
+        self.param_space = param_space
+        self.n_iter = n_iter
+        self.max_seconds = max_seconds
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.refit = refit
+        self.random_state = random_state
+
+    def _suggest(self, trial, name: str, values) -> object:
+        if not _is_range(values):
+            return trial.suggest_categorical(name, list(values))
+        if _is_int_range(values):
+            return trial.suggest_int(
+                name, values["low"], values["high"], log=bool(values.get("log"))
+            )
+        return trial.suggest_float(
+            name, values["low"], values["high"], log=bool(values.get("log"))
+        )
+
+    def fit(self, X, y) -> "BayesianSearchCV":
+        import optuna
+
+        def objective(trial) -> float:
+            params = {
+                name: self._suggest(trial, name, values)
+                for name, values in self.param_space.items()
+            }
+            estimator = clone(self.estimator).set_params(**params)
+            # Failed fits score NaN as in the sklearn searches, optuna records them as failed trials
+            return float(
+                np.mean(
+                    cross_val_score(
+                        estimator, X, y, cv=self.cv, n_jobs=self.n_jobs, error_score=np.nan
+                    )
+                )
+            )
+
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        self.study_ = optuna.create_study(
+            direction="maximize", sampler=optuna.samplers.TPESampler(seed=self.random_state)
+        )
+        self.study_.optimize(objective, n_trials=self.n_iter, timeout=self.max_seconds)
+        self.best_params_ = self.study_.best_params
+        self.best_score_ = self.study_.best_value
+        if self.refit:
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        return self
+
+
+def get_search(
+    estimator: object, model_config: Dict, n_jobs: int = 1, refit: bool = True
+) -> object:
+
+    """
+    Method Name :   get_search
+
+    Description :   This method builds the search of a model from its entry in model.yaml. The
+                    optional search key holds the strategy and budget, e.g.
+                        search: {strategy: random, n_iter: 60, max_seconds: 1800}
+                    every other key is a parameter, a list of values or, for random and bayesian,
+                    a range such as {low: 0.001, high: 0.3, log: true}. grid, random and halving are
+                    sklearn's GridSearchCV, RandomizedSearchCV and HalvingGridSearchCV, halving also
+                    takes factor, min_resources and max_resources. bayesian needs optuna.
+                    max_seconds, MODEL_SEARCH_MAX_SECONDS by default, stops every strategy from
+                    starting new candidates once spent.
+
+    Output      :   Unfitted search with best_params_ and, with refit, best_estimator_ once fitted
+    """
+    param_space = dict(model_config)
+    search_config = dict(param_space.pop("search", None) or {})
+    strategy = search_config.pop("strategy", "grid")
+    max_seconds = search_config.pop("max_seconds", MODEL_SEARCH_MAX_SECONDS) or None
+    if strategy not in SEARCH_STRATEGIES:
+        raise ValueError(f"Unknown search strategy {strategy}, expected one of {SEARCH_STRATEGIES}")
+    if strategy in ("grid", "halving") and any(map(_is_range, param_space.values())):
+        raise ValueError(f"{strategy} search needs a list of values for every parameter")
+    if strategy == "bayesian":
+        if importlib.util.find_spec("optuna") is None:
+            raise ImportError("The bayesian search strategy needs optuna, pip install optuna")
+        return BayesianSearchCV(
+            estimator,
+            param_space,
+            max_seconds=max_seconds,
+            cv=MODEL_SEARCH_CV,
+            n_jobs=n_jobs,
+            refit=refit,
+            **search_config,
+        )
+
+    common = dict(
+        max_seconds=max_seconds,
+        cv=MODEL_SEARCH_CV,
+        n_jobs=n_jobs,
+        refit=refit,
+        verbose=SEARCH_VERBOSE,
+    )
+    if strategy == "grid":
+        return BudgetedGridSearchCV(estimator, param_space, **common, **search_config)
+    if strategy == "halving":
+        search_config.setdefault("random_state", 42)
+        return BudgetedHalvingGridSearchCV(estimator, param_space, **common, **search_config)
+
+    from scipy.stats import loguniform, randint, uniform
+
+    distributions = {}
+    for name, values in param_space.items():
+        if not _is_range(values):
+            distributions[name] = list(values)
+        elif _is_int_range(values):
+            distributions[name] = randint(values["low"], values["high"] + 1)
+        elif values.get("log"):
+            distributions[name] = loguniform(values["low"], values["high"])
+        else:
+            distributions[name] = uniform(values["low"], values["high"] - values["low"])
+    search_config.setdefault("random_state", 42)
+    return BudgetedRandomizedSearchCV(estimator, distributions, **common, **search_config)
@@ -0,0 +1,29 @@
+import json
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# orjson is optional, it serializes API responses several times faster than the json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: object) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: object) -> bytes:
+        return dumps(content)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    # StreamingResponse reads from the client to notice disconnects on ASGI servers older than spec
+    # 2.4, which would swallow the request body of an endpoint still reading it while it answers.
+    # A disconnect surfaces in the body reader instead.
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,66 @@
+import os
+import pandas as pd
+import pytest
+from category_encoders.binary import BinaryEncoder
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from shipment.component.model_predictor import shippingData
+from shipment.constant import TARGET_COLUMN
+
+DATA_FILE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "notebook", "shipment.csv"
+)
+
+
+def make_preprocessor() -> ColumnTransformer:
+    # Same layout as DataTransformation.get_data_transformer_object with the schema columns
+    return ColumnTransformer(
+        [
+            (
+                "OneHotEncoder",
+                OneHotEncoder(handle_unknown="ignore"),
+                [
+                    "International",
+                    "Express Shipment",
+                    "Installation Included",
+                    "Transport",
+                    "Fragile",
+                    "Customer Information",
+                    "Remote Location",
+                ],
+            ),
+            ("BinaryEncoder", BinaryEncoder(), ["Material"]),
+            ("StandardScaler", StandardScaler(), shippingData.NUMERICAL_COLUMNS),
+        ]
+    )
+
+
+@pytest.fixture(scope="session")
+def shipment_data():
+    df = pd.read_csv(DATA_FILE_PATH)
+    df = df[list(shippingData.COLUMNS.values()) + [TARGET_COLUMN]].dropna()
+    return df.drop(columns=[TARGET_COLUMN]).reset_index(drop=True), df[TARGET_COLUMN].to_numpy()
+
+
+@pytest.fixture(scope="session")
+def fitted_preprocessor(shipment_data):
+    X, _ = shipment_data
+    return make_preprocessor().fit(X)
+
+
+@pytest.fixture(scope="session")
+def shipment_features(shipment_data, fitted_preprocessor):
+    X, y = shipment_data
+    transformed = fitted_preprocessor.transform(X)
+    return (transformed.toarray() if hasattr(transformed, "toarray") else transformed), y
+
+
+@pytest.fixture
+def edge_case_shipments(shipment_data):
+    # Unknown and missing categories take the fallback rows of the compiled lookup tables
+    X, _ = shipment_data
+    edge_cases = X.head(3).copy()
+    edge_cases.loc[0, "Material"] = "Unobtainium"
+    edge_cases.loc[1, "Transport"] = None
+    edge_cases.loc[2, "Material"] = None
+    return edge_cases
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from xgboost import XGBRegressor
+from shipment.component.model_compiler import TreeEnsembleCompiler
+
+
+@pytest.mark.parametrize(
+    "model",
+    [
+        XGBRegressor(n_estimators=200, max_depth=6, random_state=42),
+        RandomForestRegressor(n_estimators=50, max_depth=12, random_state=42),
+        GradientBoostingRegressor(n_estimators=200, random_state=42),
+    ],
+    ids=lambda model: type(model).__name__,
+)
+def test_compiled_prediction_matches_model(model, shipment_features):
+    X, y = shipment_features
+    model.fit(X, y)
+    compiled = TreeEnsembleCompiler().compile(model)
+
+    # The quoted cost is rounded to cents, it must be the same whichever engine served it
+    assert compiled.predict(X).dtype == model.predict(X).dtype
+    np.testing.assert_array_equal(np.round(compiled.predict(X), 2), np.round(model.predict(X), 2))
+    # Single rows take the same path as the small requests served by the compiled engine
+    for row in X[:20]:
+        np.testing.assert_array_equal(
+            np.round(compiled.predict(row[None, :]), 2), np.round(model.predict(row[None, :]), 2)
+        )
+    assert TreeEnsembleCompiler.verify(compiled, model, X) == 0
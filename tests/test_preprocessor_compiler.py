@@ -0,0 +1,29 @@
+import numpy as np
+from shipment.component.model_predictor import shippingData
+from shipment.component.preprocessor_compiler import PreprocessorCompiler
+
+
+def test_compiled_transform_matches_preprocessor(shipment_data, fitted_preprocessor):
+    X, _ = shipment_data
+    compiled = PreprocessorCompiler().compile(fitted_preprocessor)
+    np.testing.assert_array_equal(compiled.transform(X), fitted_preprocessor.transform(X))
+
+
+def test_unknown_and_missing_categories_match_preprocessor(
+    fitted_preprocessor, edge_case_shipments
+):
+    compiled = PreprocessorCompiler().compile(fitted_preprocessor)
+    np.testing.assert_array_equal(
+        compiled.transform(edge_case_shipments), fitted_preprocessor.transform(edge_case_shipments)
+    )
+
+
+def test_record_array_matches_preprocessor(shipment_data, fitted_preprocessor):
+    X, _ = shipment_data
+    compiled = PreprocessorCompiler().compile(fitted_preprocessor)
+    row = X.head(1)
+    record = shippingData.get_batch_data_frame(row).to_records(index=False)
+    record = record.astype(shippingData.RECORD_DTYPE)
+    out = np.empty((1, compiled.n_features_out))
+    compiled.transform(record, out)
+    np.testing.assert_array_equal(out, fitted_preprocessor.transform(row))